@@ -1,40 +1,42 @@
 from plotly import graph_objs as go
-import pandas as pd
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sim_core.store import select, store_keys
+
+# The sweep store written by new_new_model_12bins.py, one chunk per decay rate
+STORE = 'store'
 
 # Initialize a dictionary to store the data
 # This time, we store lists of lists to accumulate all averages for each bin and decay rate
 data = {f'FREQ_{i}': {} for i in range(1, 13)}
 decay_rates_set = set()
 
-pattern = re.compile(r'averages_run\d+_decay_(\d+)\.csv')
+pattern = re.compile(r'decay_(\d+)')
 
-# Step 1: Read all CSV files
+# Step 1: Read each decay rate's runs
 
-for file in os.listdir('.'):
-    match = pattern.match(file)
+for key in store_keys(STORE):
+    match = pattern.fullmatch(key)
     if match:
         decay_rate = int(match.group(1))
         decay_rates_set.add(decay_rate)
         
-        df = pd.read_csv(file)
+        averages = select(STORE, 'averages', [key])[0]  # (run, bin, row)
+        
+        # Calculate the x values
+        x_values = np.arange(averages.shape[2]) * 100
         
         # Collect data for each bin
-        for bin_name in data.keys():
-            if bin_name in df.columns:
-                if decay_rate not in data[bin_name]:
-                    data[bin_name][decay_rate] = []
-                
-                # Calculate the x values
-                x_values = np.arange(len(df)) * 100
-                
-                # Perform linear regression to get slope
-                slope, intercept = np.polyfit(x_values, df[bin_name], 1)
-                
-                # Append the slope to the list for its decay rate
-                data[bin_name][decay_rate].append(slope)
+        for i, bin_name in enumerate(data.keys()):
+            # Perform linear regression to get each run's slope
+            slopes, intercepts = np.polyfit(x_values, averages[:, i].T, 1)
+            
+            # The slopes of every run for its decay rate
+            data[bin_name][decay_rate] = slopes.tolist()
 
 
 # Calculate the overall average for each bin and decay rate
@@ -161,28 +161,32 @@ fig.update_layout(
 fig.show()'''
 
 from plotly import graph_objs as go
-import pandas as pd
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sim_core.store import select, store_keys
+
+# The sweep store written by new_new_model.py, one chunk per decay rate
+STORE = 'store'
 
 slope_dict = {}
 
-pattern = re.compile(r'averages_run\d+_decay_(\d+)\.csv')
+pattern = re.compile(r'decay_(\d+)')
 
-# Step 1: Read all CSV files and collect slopes
-for file in os.listdir('.'):
-    match = pattern.match(file)
+# Step 1: Read each decay rate's runs and collect slopes
+for key in store_keys(STORE):
+    match = pattern.fullmatch(key)
     if match:
         k = int(match.group(1))
-        df = pd.read_csv(file)
-        df['difference'] = df['FREQ_7_TO_12'] - df['FREQ_1_TO_6']
-        x = np.arange(len(df)) * 100
-        slope, intercept = np.polyfit(x, df['difference'], 1)
-        
-        if k not in slope_dict:
-            slope_dict[k] = []
-        slope_dict[k].append(slope)
+        averages = select(STORE, 'averages', [key])[0]  # (run, group, row)
+        difference = averages[:, 1] - averages[:, 0]
+        x = np.arange(difference.shape[1]) * 100
+        # One fit per run (column)
+        slopes, intercepts = np.polyfit(x, difference.T, 1)
+        slope_dict[k] = slopes.tolist()
 
 # Step 2: Average the slopes for each k value
 k_values = []
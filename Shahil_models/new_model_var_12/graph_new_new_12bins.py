@@ -73,40 +73,39 @@ fig.update_layout(
 fig.show()'''
 
 import plotly.graph_objs as go
-import pandas as pd
 import numpy as np
 import os
 import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sim_core.store import select, store_keys
+
+# The sweep store written by new_model_sample_var_form.py, one chunk per decay rate
+STORE = 'store'
 
 # Initialize a dictionary to store the data
 data = {f'FREQ_{i}_VAR': {} for i in range(1, 13)}  # Only include variance columns
 decay_rates_set = set()
 
-pattern = re.compile(r'averages_run\d+_decay_(\d+)\.csv')
+pattern = re.compile(r'decay_(\d+)')
 
-# Step 1: Read all CSV files
+# Step 1: Read each decay rate's runs
 
-for file in os.listdir('.'):
-    match = pattern.match(file)
+for key in store_keys(STORE):
+    match = pattern.fullmatch(key)
     if match:
         decay_rate = int(match.group(1))
         decay_rates_set.add(decay_rate)
         
-        df = pd.read_csv(file)
+        variances = select(STORE, 'variances', [key])[0]  # (run, bin, row)
         
         # Collect data for each bin
-        for bin_name in data.keys():
-            if bin_name in df.columns:
-                if decay_rate not in data[bin_name]:
-                    data[bin_name][decay_rate] = []
-                
-                # Append the variance to the list for its decay rate
-                #Recalcute this value
-
-
-                
-                data[bin_name][decay_rate].append(df[bin_name] )
-                #data[bin_name][decay_rate].append(df[bin_name] - (first value) )
+        for i, bin_name in enumerate(data.keys()):
+            # The variances of every run for its decay rate
+            #Recalcute this value
+            data[bin_name][decay_rate] = list(variances[:, i])
+            #data[bin_name][decay_rate] = list(variances[:, i] - variances[:, i, :1])
 
 # Calculate the overall average for each bin and decay rate
 for bin_name in data.keys():
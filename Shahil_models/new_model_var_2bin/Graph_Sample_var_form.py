@@ -100,24 +100,26 @@ fig.show()
 from plotly import graph_objs as go
 import pandas as pd
 import numpy as np
+import os
+import sys
 
-# Define the CSV file paths
-csv_paths = [f'averages_run{i}.csv' for i in range(10)]
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sim_core.store import select
 
-# Function to process and combine CSV data
-def process_csv_files(csv_paths):
-    combined_df = pd.DataFrame()
-    for path in csv_paths:
-        df = pd.read_csv(path)
-        if combined_df.empty:
-            combined_df = df.copy()
-        else:
-            combined_df += df
-    combined_df /= len(csv_paths)
-    return combined_df
+# The sweep store written by new_model_sample_var_form.py
+STORE = 'store'
+STORE_KEY = 'runs'
+runs = 10
+
+# Average the runs' group averages and variances, in the columns of the per-run CSV files
+def process_runs(runs):
+    averages = select(STORE, 'averages', [STORE_KEY], runs=slice(0, runs))[0].mean(axis=0)
+    variances = select(STORE, 'variances', [STORE_KEY], runs=slice(0, runs))[0].mean(axis=0)
+    return pd.DataFrame({'FREQ_1_TO_6': averages[0], 'FREQ_7_TO_12': averages[1],
+                         'VAR_1_TO_6': variances[0], 'VAR_7_TO_12': variances[1]})
 
-# Process the CSV files
-combined_df = process_csv_files(csv_paths)
+# Process the runs
+combined_df = process_runs(runs)
 
 # Extract iteration numbers, average values, and variances
 x = combined_df.index + 1
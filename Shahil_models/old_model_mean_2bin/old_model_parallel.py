@@ -1,18 +1,42 @@
-import random
 import json
-import shutil
-from multiprocessing import Process
-
-def process_iteration(iter_num, json_file):
-    # Duplicate the initial data file for each iteration
-    duplicated_file = f'initial_data_copy_{iter_num + 1}.json'
-    shutil.copy(json_file, duplicated_file)
-
-    with open(duplicated_file, 'r') as file:
-        data = json.load(file)
+import os
+import copy
+import sys
+from functools import partial
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from sim_core.ensemble import OverwritingEnsemble
+from sim_core.sampler import WordSampler
+from sim_core.seeding import job_seed, python_random, root_entropy, streams, write_seed_log
+from sim_core.snapshot import is_snapshot, load_snapshot, save_snapshot
+from sim_core.sweep import run_batches
+
+# Model iterations per run
+STEPS = 20000
+# Runs advanced together by one ensemble task
+ENSEMBLE_SIZE = 20
+
+def load_initial_data(json_file):
+    """The lexicon in the input JSON layout, read from the JSON file or from a snapshot such as a run's final state."""
+    if not is_snapshot(json_file):
+        with open(json_file, 'r') as file:
+            return json.load(file)
+    words, frequencies, grid, exemplars_per_word = load_snapshot(json_file)
+    return {'Category': {'words': {word: {'frequency': frequency, 'exemplars': exemplars.tolist()}
+                                   for word, frequency, exemplars in zip(words, frequencies, exemplars_per_word)}}}
+
+def process_iteration(iter_num, initial_data, seed=None):
+    # The run overwrites exemplars in place, so work on its own copy of the loaded data
+    data = copy.deepcopy(initial_data)
 
     words_data = data['Category']['words']
+    words_list = list(words_data.keys())
     frequencies = [word_info['frequency'] for word_info in words_data.values()]
+    # Separate streams for the word draws and the exemplar choices
+    word_seed, choice_seed = streams(seed, 2)
+    word_sampler = WordSampler(frequencies, np.random.default_rng(word_seed))
+    rng = python_random(choice_seed)
 
     # Initialize running means for each group
     running_mean_1_to_6 = 0
@@ -33,14 +57,14 @@ def process_iteration(iter_num, json_file):
     means_1_to_6 = {0: running_mean_1_to_6}
     means_7_to_12 = {0: running_mean_7_to_12}
 
-    for i in range(20000):  # Adjust the number of iterations as needed
-        chosen_word = random.choices(list(words_data.keys()), weights=frequencies, k=1)[0]
+    for i in range(STEPS):  # Adjust the number of iterations as needed
+        chosen_word = words_list[word_sampler.next()]
         attributes = words_data[chosen_word]
         exemplars_list = attributes['exemplars']
-        chosen_exemplar = random.choice(exemplars_list)
+        chosen_exemplar = rng.choice(exemplars_list)
 
         new_exemplar = chosen_exemplar + 0.1
-        random_index = random.randrange(len(exemplars_list))
+        random_index = rng.randrange(len(exemplars_list))
         old_value = exemplars_list[random_index]
         exemplars_list[random_index] = new_exemplar
 
@@ -54,6 +78,9 @@ def process_iteration(iter_num, json_file):
             running_mean_7_to_12 += diff / len(flattened_exemplars_7_to_12)
             means_7_to_12[i] = running_mean_7_to_12
 
+    save_results(iter_num, means_1_to_6, means_7_to_12, words_data)
+
+def save_results(iter_num, means_1_to_6, means_7_to_12, words_data):
     json_file_1_to_6 = f'averages_1_to_6_{iter_num + 1}.json'
     with open(json_file_1_to_6, 'w') as file:
         json.dump(means_1_to_6, file, indent = 4)
@@ -62,20 +89,86 @@ def process_iteration(iter_num, json_file):
     with open(json_file_7_to_12, 'w') as file:
         json.dump(means_7_to_12, file, indent = 4)
 
-    # Save the updated data back to the duplicated JSON file
-    with open(duplicated_file, 'w') as file:
-        json.dump(data, file, indent = 4)
+    # Save the final exemplars as a snapshot, which can also start a later run
+    save_snapshot(f'final_state_{iter_num + 1}.npz', list(words_data),
+                  [attributes['frequency'] for attributes in words_data.values()],
+                  exemplars_per_word=[attributes['exemplars'] for attributes in words_data.values()])
 
-def process_data(json_file, iterations=20):
-    processes = []
-
-    for iter_num in range(iterations):
-        process = Process(target=process_iteration, args=(iter_num, json_file))
-        processes.append(process)
-        process.start()
-
-    for process in processes:
-        process.join()
+def process_ensemble(first_run, replicates, initial_data, seed=None):
+    """Runs iterations first_run, first_run + 1, ... together and saves each like process_iteration."""
+    rng = np.random.default_rng(seed)
+    words_data = initial_data['Category']['words']
+    frequencies = [word_info['frequency'] for word_info in words_data.values()]
+    word_sampler = WordSampler(frequencies, rng)
+    ensemble = OverwritingEnsemble([attributes['exemplars'] for attributes in words_data.values()], replicates)
+
+    # Group 0 is frequencies 1-6 and group 1 is 7-12; a word in neither never moves a mean
+    word_groups = np.array([0 if 1 <= frequency <= 6 else 1 if 7 <= frequency <= 12 else -1 for frequency in frequencies])
+    group_exemplars = [[exemplar for attributes, group in zip(words_data.values(), word_groups) if group == g
+                        for exemplar in attributes['exemplars']] for g in (0, 1)]
+    group_sizes = np.array([max(len(exemplars), 1) for exemplars in group_exemplars])
+    initial_means = [sum(exemplars) / len(exemplars) if exemplars else 0 for exemplars in group_exemplars]
+
+    # Draw every step's word and uniforms up front; only the exemplar overwrites are sequential
+    words = word_sampler.draw(STEPS * replicates).reshape(STEPS, replicates)
+    uniforms = rng.random((2, STEPS, replicates))
+    new_exemplars, old_values = ensemble.run(words, uniforms[0], uniforms[1])
+
+    # Each step moves only its group's mean, so the means are running sums of (replicates, 2, steps + 1)
+    # increments that are zero elsewhere, which leaves the sums exactly as in the sequential loop
+    groups = word_groups[words]
+    step, replicate = np.nonzero(groups >= 0)
+    increments = np.zeros((replicates, 2, STEPS + 1))
+    increments[:, :, 0] = initial_means
+    increments[replicate, groups[step, replicate], step + 1] = \
+        (new_exemplars - old_values)[step, replicate] / group_sizes[groups[step, replicate]]
+    running_means = np.cumsum(increments, axis=2)
+
+    for replicate in range(replicates):
+        iter_num = first_run + replicate
+        means = []
+        for g in (0, 1):
+            steps = np.flatnonzero(groups[:, replicate] == g)
+            means.append({0: initial_means[g], **dict(zip(steps.tolist(), running_means[replicate, g, steps + 1].tolist()))})
+        final_words_data = {word: {'frequency': attributes['frequency'], 'exemplars': ensemble.exemplars(replicate, index)}
+                            for index, (word, attributes) in enumerate(words_data.items())}
+        save_results(iter_num, means[0], means[1], final_words_data)
+
+def run_seed(root, iter_num):
+    return job_seed(root, 'old model', iter_num)
+
+def ensemble_seed(root, first_run):
+    return job_seed(root, 'old model ensemble', first_run)
+
+def process_batch(json_file, root, iter_nums):
+    # Load the initial data once for the whole batch
+    initial_data = load_initial_data(json_file)
+
+    for iter_num in iter_nums:
+        process_iteration(iter_num, initial_data, run_seed(root, iter_num))
+
+def process_ensemble_batch(json_file, iterations, root, first_runs):
+    initial_data = load_initial_data(json_file)
+
+    for first_run in first_runs:
+        process_ensemble(first_run, min(ENSEMBLE_SIZE, iterations - first_run), initial_data,
+                         ensemble_seed(root, first_run))
+
+def process_data(json_file, iterations=20, processes=None, engine='loop', seed=None):
+    # Each run's stream is keyed by its number, so the outputs do not depend on how runs are batched;
+    # the JSON outputs have no header, so the seeds are logged alongside them
+    root = root_entropy(seed)
+    # One batch of runs per worker, at most one worker per core; the ensemble engine advances
+    # ENSEMBLE_SIZE runs per batch item instead of one
+    if engine == 'ensemble':
+        first_runs = range(0, iterations, ENSEMBLE_SIZE)
+        write_seed_log({f'runs {first_run + 1}-{min(first_run + ENSEMBLE_SIZE, iterations)}': ensemble_seed(root, first_run)
+                        for first_run in first_runs})
+        run_batches(partial(process_ensemble_batch, json_file, iterations, root), first_runs,
+                    processes, label='old model (ensemble)', runs=iterations)
+    else:
+        write_seed_log({f'run {iter_num + 1}': run_seed(root, iter_num) for iter_num in range(iterations)})
+        run_batches(partial(process_batch, json_file, root), range(iterations), processes, label='old model')
 
 
 if __name__ == '__main__':
@@ -1,29 +1,24 @@
 import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
+import os
+import sys
 from tqdm import tqdm
 from plotly.subplots import make_subplots
 
-def load_and_process_data(k_str, runs):
-    """Load data for a given k_str and return the adjusted variances (relative to each file's initial variance) for each of the 12 bins separately."""
-    all_variances = {f'variances_{i}_new': [] for i in range(1, 13)}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-    for run_number in tqdm(range(runs), desc=f'Processing runs for k={k_str}'):
-        file_path = f'Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_str}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Adjust variances for each bin
-        for i in range(1, 13):
-            series = pd.Series(data[f'variances_{i}_new'])
-            initial_variance = series.iloc[0]
-            adjusted_variance = series - initial_variance
-            all_variances[f'variances_{i}_new'].append(adjusted_variance)
+# The decay model's sweep store, one chunk per k
+STORE = 'Siddharth Decay/Siddharth Decay Model/store'
 
-    return all_variances
+def load_and_process_data(k_str, runs):
+    """Load data for a given k_str and return the adjusted variances (relative to each run's initial variance) for each of the 12 bins separately."""
+    variances = select(STORE, 'variances', [k_str], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Relative to each run's initial variance
+    variances = variances - variances[:, :, :1]
+    # One series per run for each bin
+    return {f'variances_{i + 1}_new': [pd.Series(run) for run in variances[:, i]] for i in range(12)}
 
 def plot_variances(all_variances, values, var_type='Regular'):
     """Plot the adjusted variances over iterations for each of the 12 bins as subplots, including a baseline at y=0."""
@@ -2,31 +2,25 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
+import os
+import sys
 from tqdm import tqdm
 from plotly.subplots import make_subplots
 
-def load_and_process_data(k_str, runs):
-    """Load data for a given k_str and return the averaged variances for bins 1-6 and 7-12 separately."""
-    all_variances = {'variances_1_6_new': [], 'variances_7_12_new': []}
-
-    for run_number in tqdm(range(runs), desc=f'Processing runs for k={k_str}'):
-        file_path = f'Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_str}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Calculate the average for bins 1-6 and 7-12
-        variances_1_6 = pd.concat([pd.Series(data[f'alt_variances_{i}_new']) for i in range(1, 7)], axis=1).mean(axis=1)
-        variances_7_12 = pd.concat([pd.Series(data[f'alt_variances_{i}_new']) for i in range(7, 13)], axis=1).mean(axis=1)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-        all_variances['variances_1_6_new'].append(variances_1_6)
-        all_variances['variances_7_12_new'].append(variances_7_12)
+# The decay model's sweep store, one chunk per k
+STORE = 'Siddharth Decay/Siddharth Decay Model/store'
 
-    # Average variances across all runs
-    averaged_variances = {key: pd.concat(value, axis=1).mean(axis=1) for key, value in all_variances.items()}
-
-    return averaged_variances
+def load_and_process_data(k_str, runs):
+    """Load data for a given k_str and return the averaged variances for bins 1-6 and 7-12 separately."""
+    variances = select(STORE, 'alt_variances', [k_str], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Average bins 1-6 and 7-12 within each run, then across runs; nanmean skips missing values like pandas does
+    return {
+        'variances_1_6_new': pd.Series(np.nanmean(np.nanmean(variances[:, 0:6], axis=1), axis=0)),
+        'variances_7_12_new': pd.Series(np.nanmean(np.nanmean(variances[:, 6:12], axis=1), axis=0)),
+    }
 
 def plot_variances(all_variances, values, var_type='Regular'):
     """Plot the averaged variances over iterations for bins 1-6 and bins 7-12 as subplots in a single figure."""
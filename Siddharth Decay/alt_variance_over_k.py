@@ -2,28 +2,21 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
+import os
+import sys
 from tqdm import tqdm
 
-def load_and_process_data(k_str, runs):
-    """Load data for a given k_str and return the averaged variances for bins 1-6 and 7-12 separately."""
-    all_variances = {f'alt_variances_{i}_new': [] for i in range(1, 13)}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-    for run_number in tqdm(range(runs), desc=f'Processing runs for k={k_str}'):
-        file_path = f'Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_str}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Collect variances for bins 1-12
-        for i in range(1, 13):
-            variances = pd.Series(data[f'alt_variances_{i}_new'])
-            all_variances[f'alt_variances_{i}_new'].append(variances)
+# The decay model's sweep store, one chunk per k
+STORE = 'Siddharth Decay/Siddharth Decay Model/store'
 
-    # Average variances across all runs
-    averaged_variances = {key: pd.concat(value, axis=1).mean(axis=1) for key, value in all_variances.items()}
-
-    return averaged_variances
+def load_and_process_data(k_str, runs):
+    """Load data for a given k_str and return the averaged variances for bins 1-6 and 7-12 separately."""
+    variances = select(STORE, 'alt_variances', [k_str], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Average each bin across runs; nanmean skips missing values like pandas does
+    return {f'alt_variances_{i + 1}_new': pd.Series(np.nanmean(variances[:, i], axis=0)) for i in range(12)}
 
 def plot_variances(all_variances, values, var_type='Regular'):
     """Plot the averaged variances over different k values for bins 1-12 on a single plot."""
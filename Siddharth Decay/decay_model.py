@@ -1,17 +1,54 @@
 import json
-import random
-from collections import defaultdict
+import os
+import sys
 from multiprocessing import Pool
 import numpy as np
-import copy 
 from statsmodels.stats.weightstats import DescrStatsW
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.arena import ExemplarArena
+from sim_core.ensemble import DecayEnsemble
+from sim_core.events import DecayReplay, event_columns, read_events, write_events
+from sim_core.fenwick import FenwickTree
+from sim_core.output import OutputPolicy, Recorder
+from sim_core.sampler import BLOCK_SIZE, LexiconWordSampler
+from sim_core.seeding import as_seed_sequence, python_random, root_entropy, seed_header, streams, sweep_seed
+from sim_core.store import create_store, events_path, write_run
+from sim_core.trajectory import CHANGEPOINTS, write_changepoints, write_trajectory
+
+STRENGTH_THRESHOLD = 0.000001
+
+# Replicates advanced together by one ensemble task. A step's cost is mostly fixed, so this many
+# cost only several single runs; full output holds 60 floats per replicate and iteration of a task
+ENSEMBLE_SIZE = 100
+
+# Sweep store the chart scripts read, one chunk per k
+STORE = "Siddharth Decay/Siddharth Decay Model/store"
+
+STAT_NAMES = ["means", "squared_means", "variances", "alt_variances", "strengths"]
+
+# The lexicon strengths_dicts.py starts from: the word order, and the frequencies of words a k has lost
+LEXICON_FILE = "Siddharth Decay/Data/initial_data_1cat.json"
+
 # save model state (all exemplars after all iterations at problem k value), choose a freq bin, and calculate the variance with descrstats
 def reset_data(k_str):
-    original_file = f"Siddharth Decay/Outputs/strengths_k{k_str}.json"
+    original_file = f"Siddharth Decay/Outputs/strengths_k{k_str}"
     
-    # Load data from JSON file into a dictionary
-    with open(original_file, 'r') as f:
-        data = json.load(f)
+    if os.path.exists(original_file + '.npz'):
+        # Load the record columns written by strengths_dicts.py
+        with np.load(original_file + '.npz') as saved:
+            words, records = saved['words'].tolist(), saved['records']
+        data = [
+            {'word_key': words[word_id], 'frequency': frequency, 'exemplar': exemplar, 'exemplar_strength': strength}
+            for word_id, frequency, exemplar, strength in zip(
+                records['word'].tolist(), records['frequency'].tolist(),
+                records['exemplar'].tolist(), records['exemplar_strength'].tolist()
+            )
+        ]
+    else:
+        # Load data from JSON file into a dictionary
+        with open(original_file + '.json', 'r') as f:
+            data = json.load(f)
 
     # Group data by word key with frequency, a list of exemplars, and a list of exemplar strengths
     grouped_data = {}
@@ -23,15 +60,29 @@ def reset_data(k_str):
         # Append exemplar and exemplar_strength for each word_key
         grouped_data[word_key]['exemplars'].append(item['exemplar'])
         grouped_data[word_key]['exemplar_strengths'].append(item['exemplar_strength'])
-            
-    return grouped_data
+
+    # Keep the lexicon's word order rather than the order words first appear in the records, so one
+    # word stream picks the same words at every k and in the overwriting model (common random numbers)
+    order = {word: index for index, word in enumerate(lexicon_frequencies())}
+    return dict(sorted(grouped_data.items(), key=lambda item: order.get(item[0], len(order))))
+
+def lexicon_frequencies():
+    """Frequency of every word of the lexicon, in lexicon order."""
+    with open(LEXICON_FILE, 'r') as f:
+        return {word_key: attributes['frequency'] for word_key, attributes in json.load(f)['Category']['words'].items()}
+
+def lexicon_word_sampler(words_data, rng, spare_rng):
+    """Word sampler over the full lexicon, so that runs at every k (some of which have lost words) share draws."""
+    lexicon = lexicon_frequencies()
+    lexicon_index = {word_key: index for index, word_key in enumerate(lexicon)}
+    return LexiconWordSampler(list(lexicon.values()), [lexicon_index[word_key] for word_key in words_data], rng, spare_rng)
 
 def contains_small_exemplars(exemplars_list):
-    return any(exemplar < 0.000001 for exemplar in exemplars_list)
+    return any(exemplar < STRENGTH_THRESHOLD for exemplar in exemplars_list)
 
 def remove_small_exemplars(word_data):
     # Threshold for removal
-    threshold = 0.000001
+    threshold = STRENGTH_THRESHOLD
 
     # Create new lists for exemplars and their strengths, omitting small ones
     new_exemplars = []
@@ -45,224 +96,336 @@ def remove_small_exemplars(word_data):
     word_data['exemplars'] = new_exemplars
     word_data['exemplar_strengths'] = new_exemplar_strengths
 
-def process_old_model(run_number, k_value, iterations):
+def reference_step(words_data, chosen_word, k, rng):
+    # Aggregate all exemplars and their strengths for the chosen word
+    exemplars_list = words_data[chosen_word]['exemplars']
+    exemplar_strengths = words_data[chosen_word]['exemplar_strengths']
+
+    # Choose an exemplar weighted by exemplar strength (drawing its index draws the same numbers)
+    index = rng.choices(range(len(exemplars_list)), weights=exemplar_strengths, k=1)[0]
+    chosen_exemplar = exemplars_list[index]
+    age = len(exemplars_list) - 1 - index
+
+    # Add the chosen exemplar to the end of the exemplars list
+    new_value = chosen_exemplar + 0.1
+    exemplars_list.append(new_value)
+
+    # Multiply all the exemplar strengths in the entire list by k
+    for word in words_data:
+        words_data[word]['exemplar_strengths'] = [item * k for item in words_data[word]['exemplar_strengths']]
+    exemplar_strengths.append(1)
+
+    # Update exemplar and strength lists for the chosen word
+    words_data[chosen_word]['exemplars'] = exemplars_list
+    words_data[chosen_word]['exemplar_strengths'] = exemplar_strengths
+
+    # Check and remove small exemplars if necessary
+    if len(exemplars_list) > 1 and contains_small_exemplars(exemplar_strengths):
+        remove_small_exemplars(words_data[chosen_word])
+
+    return new_value, age
+
+class LazyDecayEngine:
+    """Decays the whole exemplar cloud through one global scale factor instead of rescaling every list.
+
+    A stored weight w stands for the strength w * scale * word_scale[word], so a step only
+    touches the chosen word. Each word's segment of the arena stays in birth order and therefore
+    ascending, which lets expiry drop a prefix found by bisection. Each word also keeps a Fenwick
+    tree of its stored weights, indexed by slot relative to tree_bases[word], so that weighted
+    selection, appends and expiry cost O(log n) in the word's exemplar count.
+    """
+    # Fold the scale factors back into the stored weights before they leave float range
+    RENORMALIZE_BELOW = 1e-150
+
+    def __init__(self, words_data, k):
+        self.k = k
+        self.scale = 1.0
+        self.word_ids = {word: word_id for word_id, word in enumerate(words_data)}
+        self.word_scale = [1.0] * len(words_data)
+        self.arena = ExemplarArena.from_lists(
+            [attributes['exemplars'] for attributes in words_data.values()],
+            [attributes['exemplar_strengths'] for attributes in words_data.values()]
+        )
+        self.trees = [None] * len(words_data)
+        self.tree_bases = self.arena.offsets.copy()
+        self.tree_offsets = self.arena.offsets.copy()  # where each tree expects the live segment to start
+        self.tree_ends = self.arena.ends.copy()
+        self.rebuild_trees(range(len(words_data)))
+
+    def rebuild_trees(self, word_ids):
+        arena = self.arena
+        for word_id in word_ids:
+            self.tree_bases[word_id] = self.tree_offsets[word_id] = arena.offsets[word_id]
+            self.tree_ends[word_id] = arena.ends[word_id]
+            capacity = arena.ends[word_id] - arena.offsets[word_id]
+            self.trees[word_id] = FenwickTree(arena.strengths(word_id).tolist(), capacity=capacity)
+        self.arena_moves = arena.moves
+
+    def step(self, chosen_word, rng):
+        word_id = self.word_ids[chosen_word]
+        arena = self.arena
+        tree = self.trees[word_id]
+        base = self.tree_bases[word_id]
+        offset, length = arena.offsets[word_id], arena.lengths[word_id]
+
+        # The weights of one word share a factor, so they choose exactly like the strengths
+        slot = base + tree.find(rng.random() * tree.total())
+        slot = min(max(slot, offset), offset + length - 1)  # guard against rounding at either end
+        new_value = float(arena.value[slot]) + 0.1
+        age = offset + length - 1 - slot
+
+        # Every word decays by k, except that the reference path keeps the chosen word's old
+        # strengths undecayed (it appends to the list it read before rescaling), so undo it there
+        self.scale *= self.k
+        self.word_scale[word_id] /= self.k
+        factor = self.scale * self.word_scale[word_id]
+        slot = arena.append(word_id, new_value, 1 / factor)
+        if arena.moves != self.arena_moves:
+            # Only rebuild the trees of segments the arena actually moved
+            moved = (arena.offsets != self.tree_offsets) | (arena.ends != self.tree_ends)
+            self.rebuild_trees(np.nonzero(moved)[0])
+        else:
+            self.trees[word_id].add(slot - base, 1 / factor)
+
+        # Expired exemplars are always the oldest ones, i.e. a prefix of the word's segment
+        weak = np.searchsorted(arena.strengths(word_id), STRENGTH_THRESHOLD / factor, side='left')
+        if weak:
+            tree, base, offset = self.trees[word_id], self.tree_bases[word_id], arena.offsets[word_id]
+            for expired_slot in range(offset, offset + weak):
+                tree.add(expired_slot - base, -float(arena.strength[expired_slot]))
+            arena.trim_front(word_id, weak)
+            self.tree_offsets[word_id] = arena.offsets[word_id]
+
+        if self.scale < self.RENORMALIZE_BELOW:
+            self.renormalize()
+
+        return new_value, age
+
+    def renormalize(self):
+        arena = self.arena
+        live = arena.live()
+        factors = self.scale * np.array(self.word_scale)
+        arena.strength[:arena.size][live] *= factors[arena.word[:arena.size][live]]
+        self.word_scale = [1.0] * arena.n_words
+        self.scale = 1.0
+        self.rebuild_trees(range(arena.n_words))
+
+def initial_bin_stats(words_data):
+    """Total strength, weighted mean, weighted squared mean and variance of each frequency bin."""
+    bins = np.concatenate([[attributes['frequency'] - 1] * len(attributes['exemplars']) for attributes in words_data.values()])
+    exemplars = np.concatenate([attributes['exemplars'] for attributes in words_data.values()])
+    strengths = np.concatenate([attributes['exemplar_strengths'] for attributes in words_data.values()])
+
+    total_strengths = np.bincount(bins, weights=strengths, minlength=12)
+    means = np.bincount(bins, weights=strengths * exemplars, minlength=12) / total_strengths
+    squared_means = np.bincount(bins, weights=strengths * exemplars ** 2, minlength=12) / total_strengths
+    variances = np.array([DescrStatsW(exemplars[bins == i], strengths[bins == i], ddof=0).var for i in range(12)])
+    return total_strengths, means, squared_means, variances
+
+def stat_ratios(k_value):
+    """Per-iteration factor of each stat between the iterations that choose its bin: strengths decay by k, the rest hold."""
+    return [1, 1, 1, 1, float(f"0.{k_value}")]
+
+def save_trajectories(recorded, run_number, k_value, store=None, output=None, **metadata):
+    """Writes a run's (len(STAT_NAMES), 12, recorded) array, as kept by a Recorder for output (full by default),
+    into the sweep store, or without one as a per-run file."""
+    output = output or OutputPolicy()
+    # The strengths only decay by exactly k per column in full trajectories; decimated ones are stored point by point
+    ratios = stat_ratios(k_value) if output.mode == 'full' else None
+    if store is not None:
+        write_run(store, k_value, run_number, recorded, ratios)
+        return
+    file_path = f"Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_value}.traj"
+    if output.summary:
+        write_trajectory(file_path, recorded, STAT_NAMES, k=k_value, run=run_number, **output.header(), **metadata)
+        return
+    write_changepoints(file_path, recorded, STAT_NAMES, ratios, k=k_value, run=run_number, **output.header(), **metadata)
+
+def events_file(run_number, k_value, store=None):
+    """Where a run's event log goes: in the sweep store, or without one beside the per-run trajectory files."""
+    if store is not None:
+        return events_path(store, k_value, run_number)
+    return f"Siddharth Decay/Siddharth Decay Model/events_r{run_number}_k{k_value}.events"
+
+def load_replay(run_number, k_value, store=STORE):
+    """Replays a run recorded with OutputPolicy(events=True) from its event log, for statistics it did not save."""
+    header, events = read_events(events_file(run_number, k_value, store))
+    words_data = reset_data(k_value)
+    return DecayReplay([attributes['exemplars'] for attributes in words_data.values()],
+                       [attributes['exemplar_strengths'] for attributes in words_data.values()],
+                       events['word'], events['age'], float(f"0.{k_value}"), STRENGTH_THRESHOLD)
+
+def process_old_model(run_number, k_value, iterations, engine='lazy', seed=None, store=None, output=None):
     words_data = reset_data(k_value)  # Load original data without copying
+    output = output or OutputPolicy()
+    # Separate streams for the word draws and the exemplar choices, both derived from the recorded seed
+    seed = as_seed_sequence(seed)
+    word_seed, choice_seed, spare_seed = streams(seed, 3)
+    rng = python_random(choice_seed)
 
-    # Create a copy of the dataframe and square all exemplars in one
-    words_data_squared = copy.deepcopy(words_data) 
-    for word, attributes in words_data_squared.items():
-        attributes['exemplars'] = [exemplar ** 2 for exemplar in attributes['exemplars']]
-
-    # Calculate k from the sum of frequencies
-    frequencies = [word_info['frequency'] for word_info in words_data.values()]
     k = float(f"0.{k_value}")
     words_list = [key for key in words_data.keys()]
+    word_sampler = lexicon_word_sampler(words_data, np.random.default_rng(word_seed), np.random.default_rng(spare_seed))
+
+    # Current statistics of frequency bins 1 - 12, one row per entry of STAT_NAMES; the recorder keeps
+    # what output writes of them, so summary-only runs never hold the whole trajectories
+    state = np.empty((len(STAT_NAMES), 12))
+    means, squared_means, variances, alt_variances, strengths = state
+    total_strengths, means[:], squared_means[:], variances[:] = initial_bin_stats(words_data)
+    alt_variances[:] = variances
+    strengths[:] = total_strengths
+    recorder = Recorder(output, state.shape, iterations + 1)
+    recorder.record(state)
 
-   # Initialize lists to store values for 1 - 12 each
-    data_dict = {
-        **{f"means_{i}_new": [] for i in range(1, 13)},
-        **{f"squared_means_{i}_new": [] for i in range(1, 13)},
-        **{f"variances_{i}_new": [] for i in range(1, 13)},
-        **{f"alt_variances_{i}_new": [] for i in range(1, 13)},
-        **{f"strengths_{i}_new": [] for i in range(1, 13)},
-        **{f"word_variances_{i}": [] for i in range(1, 13)}
-    }
-
-    # Filter words_data to get groups based on 'frequency'
-    group_1 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 1}
-    group_2 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 2}
-    group_3 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 3}
-    group_4 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 4}
-    group_5 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 5}
-    group_6 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 6}
-    group_7 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 7}
-    group_8 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 8}
-    group_9 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 9}
-    group_10 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 10}
-    group_11 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 11}
-    group_12 = {word: attributes for word, attributes in words_data.items() if attributes['frequency'] == 12}
-
-    # Flatten the 'exemplars' lists for groups
-    flattened_exemplars_1 = [exemplar for attributes in group_1.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_2 = [exemplar for attributes in group_2.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_3 = [exemplar for attributes in group_3.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_4 = [exemplar for attributes in group_4.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_5 = [exemplar for attributes in group_5.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_6 = [exemplar for attributes in group_6.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_7 = [exemplar for attributes in group_7.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_8 = [exemplar for attributes in group_8.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_9 = [exemplar for attributes in group_9.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_10 = [exemplar for attributes in group_10.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_11 = [exemplar for attributes in group_11.values() for exemplar in attributes['exemplars']]
-    flattened_exemplars_12 = [exemplar for attributes in group_12.values() for exemplar in attributes['exemplars']]
-
-    # Flatten the 'exemplar_strengths' lists for groups
-    flattened_strengths_1 = [strength for attributes in group_1.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_2 = [strength for attributes in group_2.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_3 = [strength for attributes in group_3.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_4 = [strength for attributes in group_4.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_5 = [strength for attributes in group_5.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_6 = [strength for attributes in group_6.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_7 = [strength for attributes in group_7.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_8 = [strength for attributes in group_8.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_9 = [strength for attributes in group_9.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_10 = [strength for attributes in group_10.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_11 = [strength for attributes in group_11.values() for strength in attributes['exemplar_strengths']]
-    flattened_strengths_12 = [strength for attributes in group_12.values() for strength in attributes['exemplar_strengths']]
-
-    # Calculate the total strength for groups
-    total_strength_1 = sum(flattened_strengths_1)
-    total_strength_2 = sum(flattened_strengths_2)
-    total_strength_3 = sum(flattened_strengths_3)
-    total_strength_4 = sum(flattened_strengths_4)
-    total_strength_5 = sum(flattened_strengths_5)
-    total_strength_6 = sum(flattened_strengths_6)
-    total_strength_7 = sum(flattened_strengths_7)
-    total_strength_8 = sum(flattened_strengths_8)
-    total_strength_9 = sum(flattened_strengths_9)
-    total_strength_10 = sum(flattened_strengths_10)
-    total_strength_11 = sum(flattened_strengths_11)
-    total_strength_12 = sum(flattened_strengths_12)
-
-    # Calculate the mean of 'exemplars' weighted by strength for groups
-    data_dict["means_1_new"].append(sum(e * s for e, s in zip(flattened_exemplars_1, flattened_strengths_1)) / total_strength_1)
-    data_dict["means_2_new"].append(sum(e * s for e, s in zip(flattened_exemplars_2, flattened_strengths_2)) / total_strength_2)
-    data_dict["means_3_new"].append(sum(e * s for e, s in zip(flattened_exemplars_3, flattened_strengths_3)) / total_strength_3)
-    data_dict["means_4_new"].append(sum(e * s for e, s in zip(flattened_exemplars_4, flattened_strengths_4)) / total_strength_4)
-    data_dict["means_5_new"].append(sum(e * s for e, s in zip(flattened_exemplars_5, flattened_strengths_5)) / total_strength_5)
-    data_dict["means_6_new"].append(sum(e * s for e, s in zip(flattened_exemplars_6, flattened_strengths_6)) / total_strength_6)
-    data_dict["means_7_new"].append(sum(e * s for e, s in zip(flattened_exemplars_7, flattened_strengths_7)) / total_strength_7)
-    data_dict["means_8_new"].append(sum(e * s for e, s in zip(flattened_exemplars_8, flattened_strengths_8)) / total_strength_8)
-    data_dict["means_9_new"].append(sum(e * s for e, s in zip(flattened_exemplars_9, flattened_strengths_9)) / total_strength_9)
-    data_dict["means_10_new"].append(sum(e * s for e, s in zip(flattened_exemplars_10, flattened_strengths_10)) / total_strength_10)
-    data_dict["means_11_new"].append(sum(e * s for e, s in zip(flattened_exemplars_11, flattened_strengths_11)) / total_strength_11)
-    data_dict["means_12_new"].append(sum(e * s for e, s in zip(flattened_exemplars_12, flattened_strengths_12)) / total_strength_12)
-
-    '''SQUARED'''
-
-    # Filter words_data to get groups based on 'frequency'
-    squared_group_1 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 1}
-    squared_group_2 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 2}
-    squared_group_3 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 3}
-    squared_group_4 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 4}
-    squared_group_5 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 5}
-    squared_group_6 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 6}
-    squared_group_7 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 7}
-    squared_group_8 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 8}
-    squared_group_9 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 9}
-    squared_group_10 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 10}
-    squared_group_11 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 11}
-    squared_group_12 = {word: attributes for word, attributes in words_data_squared.items() if attributes['frequency'] == 12}
-
-    # Flatten the 'exemplars' lists for groups
-    squared_flattened_exemplars_1 = [exemplar for attributes in squared_group_1.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_2 = [exemplar for attributes in squared_group_2.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_3 = [exemplar for attributes in squared_group_3.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_4 = [exemplar for attributes in squared_group_4.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_5 = [exemplar for attributes in squared_group_5.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_6 = [exemplar for attributes in squared_group_6.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_7 = [exemplar for attributes in squared_group_7.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_8 = [exemplar for attributes in squared_group_8.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_9 = [exemplar for attributes in squared_group_9.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_10 = [exemplar for attributes in squared_group_10.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_11 = [exemplar for attributes in squared_group_11.values() for exemplar in attributes['exemplars']]
-    squared_flattened_exemplars_12 = [exemplar for attributes in squared_group_12.values() for exemplar in attributes['exemplars']]
-
-    for i in range(1, 13):
-        squared_exemplars = locals()[f"squared_flattened_exemplars_{i}"]
-        strengths = locals()[f"flattened_strengths_{i}"]
-        total_strength = locals()[f"total_strength_{i}"]
-        exemplars = locals()[f"flattened_exemplars_{i}"]
-
-        # SQUARED
-        data_dict[f"squared_means_{i}_new"].append(
-            sum(e * s for e, s in zip(squared_exemplars, strengths)) / total_strength
-        )
-
-        # STRENGTHS
-        data_dict[f"strengths_{i}_new"].append(total_strength)
+    '''LOOP'''
 
-        # NEW METHOD FOR VARIANCES
-        variance = DescrStatsW(exemplars, strengths, ddof=0).var
-        data_dict[f"variances_{i}_new"].append(variance)
-        data_dict[f"alt_variances_{i}_new"].append(variance)
+    # Each step's word and the age of the exemplar it copied, for replaying the run (see DecayReplay)
+    events = event_columns(iterations, 'word', 'age') if output.events else None
 
-    '''LOOP'''
+    # The lazy engine gives the same trajectories as the list-based reference path on a given seed
+    if engine == 'lazy':
+        lazy_engine = LazyDecayEngine(words_data, k)
+        step = lazy_engine.step
+    elif engine == 'list':
+        step = lambda chosen_word, rng: reference_step(words_data, chosen_word, k, rng)
+    else:
+        raise ValueError(f"Unknown decay engine: {engine}")
 
     # Simulation loops
-    for i in range(iterations):
-        chosen_word = random.choices(words_list, weights=frequencies, k=1)[0]
-
-        # Aggregate all exemplars and their strengths for the chosen word
-        exemplars_list = words_data[chosen_word]['exemplars']
-        exemplar_strengths = words_data[chosen_word]['exemplar_strengths']
-
-        # Choose an exemplar weighted by exemplar strength
-        chosen_exemplar = random.choices(exemplars_list, weights=exemplar_strengths, k=1)[0]
-
-        # Add the chosen exemplar to the end of the exemplars list
-        new_value = chosen_exemplar + 0.1
-        exemplars_list.append(new_value)
-
-        # Multiply all the exemplar strengths in the entire list by k
-        for word in words_data:
-            words_data[word]['exemplar_strengths'] = [item * k for item in words_data[word]['exemplar_strengths']]
-        exemplar_strengths.append(1)
-
-        # Update exemplar and strength lists for the chosen word
-        words_data[chosen_word]['exemplars'] = exemplars_list
-        words_data[chosen_word]['exemplar_strengths'] = exemplar_strengths
-
-        # Check and remove small exemplars if necessary
-        if len(exemplars_list) > 1 and contains_small_exemplars(exemplar_strengths):
-            remove_small_exemplars(words_data[chosen_word])
-              
-        # Store means
-        freq = words_data[chosen_word]['frequency']
-        k_float = float(f"0.{k_value}")
-
-        for i in range(1, 13):
-            if i == freq:
-                # Current Frequencies
-                strengths = data_dict[f"strengths_{i}_new"][-1] * k_float + 1
-                data_dict[f"strengths_{i}_new"].append(strengths)
-                means = data_dict[f"means_{i}_new"][-1] + (new_value - data_dict[f"means_{i}_new"][-1]) / strengths
-                data_dict[f"means_{i}_new"].append(means)
-                
-                squared_means = data_dict[f"squared_means_{i}_new"][-1] + (new_value**2 - data_dict[f"squared_means_{i}_new"][-1]) / strengths
-                data_dict[f"squared_means_{i}_new"].append(squared_means)
-                
-                basic = (means - data_dict[f"means_{i}_new"][-2])**2
-                variance = data_dict[f"variances_{i}_new"][-1] + basic - (data_dict[f"variances_{i}_new"][-1] + basic) / (k * eval(f'total_strength_{i}') + 1) + (new_value - means)**2 / (k * eval(f'total_strength_{i}') + 1)
-                data_dict[f"variances_{i}_new"].append(variance)
-                
-                alt_variance = squared_means - (means ** 2)
-                data_dict[f"alt_variances_{i}_new"].append(alt_variance)
-            else:
-                # Other Frequencies
-                strengths = data_dict[f"strengths_{i}_new"][-1] * k_float
-                data_dict[f"strengths_{i}_new"].append(strengths)
-                data_dict[f"means_{i}_new"].append(data_dict[f"means_{i}_new"][-1])
-                data_dict[f"squared_means_{i}_new"].append(data_dict[f"squared_means_{i}_new"][-1])
-                data_dict[f"variances_{i}_new"].append(data_dict[f"variances_{i}_new"][-1])
-                data_dict[f"alt_variances_{i}_new"].append(data_dict[f"alt_variances_{i}_new"][-1])
-
-    # Save the data dictionary to a single JSON file
-    file_path = f"Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_value}.json"
-    with open(file_path, 'w') as f:
-        json.dump(data_dict, f)
-
-    return data_dict
+    for t in range(iterations):
+        word = word_sampler.next()
+        chosen_word = words_list[word]
+        new_value, age = step(chosen_word, rng)
+        if events is not None:
+            events['word'][t], events['age'][t] = word, age
+
+        # Other frequencies carry their statistics forward while their strength decays
+        strengths *= k
+
+        # Current frequency
+        i = words_data[chosen_word]['frequency'] - 1
+        strengths[i] += 1
+        strength = strengths[i]
+        previous_mean = means[i]
+        mean = previous_mean + (new_value - previous_mean) / strength
+        means[i] = mean
+        squared_means[i] += (new_value**2 - squared_means[i]) / strength
+
+        basic = (mean - previous_mean)**2
+        variances[i] = variances[i] + basic - (variances[i] + basic) / (k * total_strengths[i] + 1) + (new_value - mean)**2 / (k * total_strengths[i] + 1)
+        alt_variances[i] = squared_means[i] - (mean ** 2)
+        recorder.record(state)
+
+    recorded = recorder.result()
+    save_trajectories(recorded, run_number, k_value, store, output, engine=engine, **seed_header(seed))
+    if events is not None:
+        write_events(events_file(run_number, k_value, store), events, k=k_value, run=run_number, engine=engine, **seed_header(seed))
+
+    return recorded
+
+def ensemble_old_model(first_run, k_value, iterations, replicates, seed=None, store=None, output=None):
+    """Runs replicates first_run, first_run + 1, ... of one k together and saves each like process_old_model."""
+    words_data = reset_data(k_value)
+    output = output or OutputPolicy()
+    k = float(f"0.{k_value}")
+    seed = as_seed_sequence(seed)
+    word_seed, choice_seed, spare_seed = streams(seed, 3)
+    rng = np.random.default_rng(choice_seed)
+    word_sampler = lexicon_word_sampler(words_data, np.random.default_rng(word_seed), np.random.default_rng(spare_seed))
+    word_bins = np.array([attributes['frequency'] - 1 for attributes in words_data.values()])
+    ensemble = DecayEnsemble(
+        [attributes['exemplars'] for attributes in words_data.values()],
+        [attributes['exemplar_strengths'] for attributes in words_data.values()],
+        k, replicates, STRENGTH_THRESHOLD
+    )
+
+    # Per-bin state of every replicate, all starting from the same cloud, laid out as the recorder keeps it
+    state = np.empty((len(STAT_NAMES), 12, replicates))
+    means, squared_means, variances, alt_variances, strengths = state
+    total_strengths, bin_means, bin_squared_means, bin_variances = initial_bin_stats(words_data)
+    means[:], squared_means[:], variances[:] = bin_means[:, None], bin_squared_means[:, None], bin_variances[:, None]
+    alt_variances[:] = variances
+    strengths[:] = total_strengths[:, None]
+    recorder = Recorder(output, state.shape, iterations + 1)
+    events = event_columns((iterations, replicates), 'word', 'age') if output.events else None
+    recorder.record(state)
+
+    # Each step updates one (bin, replicate) cell of every stat, addressed in the flattened rows
+    cells = state.reshape(len(STAT_NAMES), -1)
+    word_cells = word_bins * replicates
+    denominators = k * total_strengths[word_bins] + 1
+    r = np.arange(replicates)
+    # Words and uniforms are drawn a block of steps at a time
+    block = max(1, BLOCK_SIZE // replicates)
+    for t in range(iterations):
+        if t % block == 0:
+            steps = min(block, iterations - t)
+            word_block = word_sampler.draw(steps * replicates).reshape(steps, replicates)
+            uniform_block = rng.random((steps, replicates))
+        words = word_block[t % block]
+        new_values, ages = ensemble.step(words, uniform_block[t % block])
+        if events is not None:
+            events['word'][t], events['age'][t] = words, ages
+        chosen = word_cells[words] + r
+
+        # Same recursions as process_old_model, applied to each replicate's chosen bin
+        strengths *= k
+        previous_means, squared_mean, previous_variances, _, strength = cells[:, chosen]
+        strength += 1
+        mean = previous_means + (new_values - previous_means) / strength
+        squared_mean += (new_values ** 2 - squared_mean) / strength
+
+        basic = (mean - previous_means) ** 2
+        denominator = denominators[words]
+        variance = previous_variances + basic - (previous_variances + basic) / denominator + (new_values - mean) ** 2 / denominator
+        cells[:, chosen] = mean, squared_mean, variance, squared_mean - mean ** 2, strength
+
+        recorder.record(state)
+
+    # (stat, bin, replicate, recorded)
+    recorded = recorder.result()
+    for replicate in range(replicates):
+        save_trajectories(recorded[:, :, replicate], first_run + replicate, k_value, store, output, engine='ensemble', replicate=replicate,
+                          **seed_header(seed))
+        if events is not None:
+            write_events(events_file(first_run + replicate, k_value, store), {name: column[:, replicate] for name, column in events.items()},
+                         k=k_value, run=first_run + replicate, engine='ensemble', replicate=replicate, **seed_header(seed))
 
 def run_task(args):
-    run_number, k_value, iterations = args
-    process_old_model(run_number, k_value, iterations)
+    run_number, k_value, iterations, engine, seed, store, output = args
+    process_old_model(run_number, k_value, iterations, engine, seed, store, output)
+
+def run_ensemble_task(args):
+    first_run, k_value, iterations, replicates, seed, store, output = args
+    ensemble_old_model(first_run, k_value, iterations, replicates, seed, store, output)
+
+def parallel_old_model(k_values, iterations, num_workers=10, engine='lazy', runs=100, seed=None, common=False, store=STORE, output=None):
+    # output picks full, decimated or summary-only runs (see OutputPolicy); full by default
+    output = output or OutputPolicy()
+    # Every task gets its own stream keyed by (model, k, run), so the outputs do not depend on the pool;
+    # with common, all k values of a run share one stream instead
+    root = root_entropy(seed)
+    # The ensemble engine advances ENSEMBLE_SIZE runs of one k per task instead of one run per task
+    if engine == 'ensemble':
+        tasks = [(first_run, k_value, iterations, min(ENSEMBLE_SIZE, runs - first_run), sweep_seed(root, first_run, 'decay ensemble', k_value, common=common), store, output)
+                 for k_value in k_values for first_run in range(0, runs, ENSEMBLE_SIZE)]
+        seeds = {f"k{k_value} runs {first_run}-{first_run + replicates - 1}": seed for first_run, k_value, _, replicates, seed, _, _ in tasks}
+        task = run_ensemble_task
+    else:
+        # The lazy and list engines are the same model, so they share streams
+        tasks = [(run_number, k_value, iterations, engine, sweep_seed(root, run_number, 'decay', k_value, common=common), store, output)
+                 for k_value in k_values for run_number in range(runs)]
+        seeds = {f"k{k_value} run {run_number}": seed for run_number, k_value, _, _, seed, _, _ in tasks}
+        task = run_task
+
+    # Without a store every run writes its own trajectory file instead
+    if store is not None:
+        # Summaries have a fixed size, so their chunks are preallocated rather than change-point encoded
+        create_store(store, k_values, runs, STAT_NAMES, 12, output.recorded(iterations + 1), seeds,
+                     None if output.summary else CHANGEPOINTS, engine=engine, common=common, **output.header())
 
-def parallel_old_model(k_values, iterations, num_workers=10):
-    tasks = [(run_number, k_value, iterations) for k_value in k_values for run_number in range(100)]
-    
     with Pool(processes=num_workers) as pool:
-        pool.map(run_task, tasks)
+        pool.map(task, tasks)
 
 if __name__ == '__main__':
     values = [x*10 for x in range(1, 101, 10)]
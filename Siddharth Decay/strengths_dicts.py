@@ -1,8 +1,15 @@
-import random
 import json
-import dataclasses
-from dataclasses import dataclass
+import os
+import sys
+from collections import defaultdict
 from multiprocessing import Pool
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.sampler import WordSampler
+from sim_core.seeding import job_seed, python_random, root_entropy, seed_header, streams
+
+STRENGTH_THRESHOLD = 1e-10
 
 def reset_data():
     # Read the initial data file
@@ -26,82 +33,152 @@ def reset_data():
 
     return pivoted_data_path
 
-@dataclass
-class ExemplarData:
-    word_key: str
-    exemplar: str
-    exemplar_index: int
-    frequency: int
-    exemplar_strength: float
-
-    @staticmethod
-    def add_exemplar(exemplar_data_list, chosen_word, new_exemplar, exemplar_index, frequency):
-        exemplar_data_list.append(
-            ExemplarData(
-                word_key=chosen_word,
-                exemplar=new_exemplar,
-                exemplar_index=exemplar_index,
-                frequency=int(frequency),
-                exemplar_strength=1
-            )
-        )
-
-    @staticmethod
-    def remove_weak_exemplars(exemplar_data_list):
-        return [data for data in exemplar_data_list if data.exemplar_strength >= 1e-10]
-
-    @staticmethod
-    def get_weights(exemplar_data_list, chosen_word, exemplars_list):
-        weights = [0] * len(exemplars_list)  # Initialize all weights to 0
-
-        for idx, exemplar in enumerate(exemplars_list):
-            for data in exemplar_data_list:
-                if data.word_key == chosen_word and data.exemplar == exemplar and data.exemplar_index == idx:
-                    weights[idx] += data.exemplar_strength  # Incrementing the weight
-
-        # Replace any zero weights with 1 (default weight)
-        weights = [weight if weight > 0 else 1 for weight in weights]
-
+def decay_table(k_value, iterations):
+    """Strength of a record after each number of decays, up to the first age at which it expires."""
+    # Same repeated multiplication as decaying each record in place, so expiry happens at the same age
+    strengths = [1]
+    while strengths[-1] >= STRENGTH_THRESHOLD and len(strengths) <= iterations:
+        strengths.append(strengths[-1] * k_value)
+    return strengths
+
+class StrengthIndex:
+    """Total strength of the live records behind each (word id, exemplar_index), kept up to date
+    as records are added, decayed and expired so a word's weights never need a scan of all records.
+
+    Totals are stored relative to one global decay scale, so decaying every key costs O(1).
+    """
+    # Fold the scale back into the totals before it leaves float range
+    RENORMALIZE_BELOW = 1e-150
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = defaultdict(int)  # live records per key, so emptied keys are dropped exactly
+        self.scale = 1.0
+
+    def add(self, word_id, exemplar_index, strength):
+        key = (word_id, exemplar_index)
+        self.totals[key] = self.totals.get(key, 0) + strength / self.scale
+        self.counts[key] += 1
+
+    def remove(self, word_id, exemplar_index, strength):
+        key = (word_id, exemplar_index)
+        self.counts[key] -= 1
+        if self.counts[key] == 0:
+            del self.totals[key], self.counts[key]
+        else:
+            self.totals[key] -= strength / self.scale
+
+    def decay(self, k_value):
+        self.scale *= k_value
+        if self.scale < self.RENORMALIZE_BELOW:
+            for key in self.totals:
+                self.totals[key] *= self.scale
+            self.scale = 1.0
+
+    def weights(self, word_id, n_exemplars):
+        # Exemplars without any live record get the default weight of 1
+        weights = []
+        for idx in range(n_exemplars):
+            key = (word_id, idx)
+            weights.append(self.totals[key] * self.scale if key in self.totals else 1)
         return weights
 
+# Column layout of the saved records; word ids index the saved word list
+RECORD_DTYPE = np.dtype([
+    ('word', np.int32),
+    ('exemplar', np.float64),
+    ('exemplar_index', np.int32),
+    ('frequency', np.int8),
+    ('exemplar_strength', np.float64)
+])
+
+class ExemplarRecords:
+    """Exemplar records in one structured array used as a ring buffer, oldest record first.
+
+    One record is born per iteration and all records decay alike, so the records stay in birth
+    order, the oldest one is length - 1 iterations old and only the front can expire. A buffer with
+    one slot per entry of the decay table can therefore never overflow.
+    """
+
+    def __init__(self, words, capacity):
+        self.words = list(words)
+        self.records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.start = 0
+        self.length = 0
+
+    def add_exemplar(self, strength_index, word_id, new_exemplar, exemplar_index, frequency):
+        strength_index.add(word_id, exemplar_index, 1)
+        slot = (self.start + self.length) % len(self.records)
+        self.records[slot] = (word_id, new_exemplar, exemplar_index, frequency, 1)
+        self.length += 1
+
+    def remove_weak_exemplars(self, strength_index, strengths):
+        while strengths[self.length - 1] < STRENGTH_THRESHOLD:
+            record = self.records[self.start]
+            self.start = (self.start + 1) % len(self.records)
+            self.length -= 1
+            strength_index.remove(int(record['word']), int(record['exemplar_index']), strengths[self.length])
+
+    def get_weights(self, strength_index, word_id, exemplars_list):
+        # A record's exemplar is always exemplars_list[exemplar_index], so its (word, index) key
+        # identifies it and each weight is the total strength of that key's records
+        return strength_index.weights(word_id, len(exemplars_list))
+
+    def save(self, path, strengths, seed):
+        """Writes the live records in birth order, with strengths from their ages, and the run's seed as one .npz."""
+        records = np.roll(self.records, -self.start)[:self.length]
+        records['exemplar_strength'] = np.asarray(strengths, dtype=float)[self.length - 1 - np.arange(self.length)]
+        np.savez(path, records=records, words=np.array(self.words), seed=np.array(json.dumps(seed_header(seed))))
+
 def process_with_k_value(args):
-    k_value, iterations, pivoted_data_path = args
+    k_value, iterations, pivoted_data_path, seed = args
     # Load the processed data
     with open(pivoted_data_path, 'r') as file:
         words_dict = json.load(file)
     
     words_data = list(words_dict.keys())
     frequencies = [word_info['frequency'] for word_info in words_dict.values()]
+    word_seed, choice_seed = streams(seed, 2)
+    word_sampler = WordSampler(frequencies, np.random.default_rng(word_seed))
+    rng = python_random(choice_seed)
 
-    exemplar_data_list = []
+    strength_index = StrengthIndex()
+    strengths = decay_table(k_value, iterations)
+    exemplar_records = ExemplarRecords(words_data, capacity=len(strengths))
     for i in range(iterations):
-        chosen_word = random.choices(words_data, weights=frequencies, k=1)[0]
+        word_id = word_sampler.next()
+        chosen_word = words_data[word_id]
         chosen_word_info = words_dict[chosen_word]  # Access the chosen word's data directly from the dictionary
         exemplars_list = chosen_word_info['exemplars']
         frequency = chosen_word_info['frequency']
 
-        weights = ExemplarData.get_weights(exemplar_data_list, chosen_word, exemplars_list) 
+        weights = exemplar_records.get_weights(strength_index, word_id, exemplars_list) 
 
-        exemplar_index = random.choices(range(len(exemplars_list)), weights=weights, k=1)[0]
+        exemplar_index = rng.choices(range(len(exemplars_list)), weights=weights, k=1)[0]
         new_exemplar = exemplars_list[exemplar_index]
 
-        for data in exemplar_data_list:
-            data.exemplar_strength *= k_value
+        # Record strengths follow from their age, so only the index's scale decays
+        strength_index.decay(k_value)
                 
         # Add the new exemplar to the chosen word
-        ExemplarData.add_exemplar(exemplar_data_list, chosen_word, new_exemplar, exemplar_index, frequency)
-        exemplar_data_list = ExemplarData.remove_weak_exemplars(exemplar_data_list)
+        exemplar_records.add_exemplar(strength_index, word_id, new_exemplar, exemplar_index, frequency)
+        exemplar_records.remove_weak_exemplars(strength_index, strengths)
 
     k_str = "{:06.5f}".format(k_value).replace('.', '')[1:]
-    strengths_path = f"Siddharth Decay/Outputs/strengths_k{k_str}.json"
+    strengths_path = f"Siddharth Decay/Outputs/strengths_k{k_str}.npz"
     
-    with open(strengths_path, 'w') as f:
-         json.dump([dataclasses.asdict(data) for data in exemplar_data_list], f)
+    exemplar_records.save(strengths_path, strengths, seed)
 
-def parallel_process_with_k_values(k_values, iterations):
+def parallel_process_with_k_values(k_values, iterations, seed=None, common=False):
     pivoted_data_path = reset_data()
-    # Prepare arguments for pool processing
-    args = [(k_value, iterations, pivoted_data_path) for k_value in k_values]
+    # Prepare arguments for pool processing, with one stream per k whatever the pool size (or, with
+    # common, one stream shared by every k). The common stream has its own key: sweep_seed's would be
+    # that of run 0 of the decay and overwriting models, which would then replay the word draws that
+    # built their own starting lexicon
+    root = root_entropy(seed)
+    args = [(k_value, iterations, pivoted_data_path,
+             job_seed(root, 'strengths', 'common') if common else job_seed(root, 'strengths', k_value, 0))
+            for k_value in k_values]
     
     with Pool(processes=10) as pool:
         pool.map(process_with_k_value, args)
@@ -2,45 +2,27 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
+import os
+import sys
 from tqdm import tqdm
 from plotly.subplots import make_subplots
 
-def load_and_process_data(k_str, runs):
-    """Load data for a given k_str and return the adjusted variances (relative to each file's initial variance) for bins 1-6 and 7-12 separately."""
-    all_variances = {'variances_1_6_new': [], 'variances_7_12_new': []}
-
-    for run_number in tqdm(range(runs), desc=f'Processing runs for k={k_str}'):
-        file_path = f'Siddharth Decay/Siddharth Decay Model/all_data_r{run_number}_k{k_str}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Adjust variances for bins 1-6
-        variances_1_6 = []
-        for i in range(1, 7):
-            series = pd.Series(data[f'variances_{i}_new'])
-            initial_variance = series.iloc[0]
-            adjusted_variance = series - initial_variance
-            variances_1_6.append(adjusted_variance)
-        variances_1_6 = pd.concat(variances_1_6, axis=1).mean(axis=1)
-
-        # Adjust variances for bins 7-12
-        variances_7_12 = []
-        for i in range(7, 13):
-            series = pd.Series(data[f'variances_{i}_new'])
-            initial_variance = series.iloc[0]
-            adjusted_variance = series - initial_variance
-            variances_7_12.append(adjusted_variance)
-        variances_7_12 = pd.concat(variances_7_12, axis=1).mean(axis=1)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-        all_variances['variances_1_6_new'].append(variances_1_6)
-        all_variances['variances_7_12_new'].append(variances_7_12)
+# The decay model's sweep store, one chunk per k
+STORE = 'Siddharth Decay/Siddharth Decay Model/store'
 
-    # Average variances across all runs
-    averaged_variances = {key: pd.concat(value, axis=1).mean(axis=1) for key, value in all_variances.items()}
-
-    return averaged_variances
+def load_and_process_data(k_str, runs):
+    """Load data for a given k_str and return the adjusted variances (relative to each run's initial variance) for bins 1-6 and 7-12 separately."""
+    variances = select(STORE, 'variances', [k_str], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Relative to each run's initial variance
+    variances = variances - variances[:, :, :1]
+    # Average bins 1-6 and 7-12 within each run, then across runs; nanmean skips missing values like pandas does
+    return {
+        'variances_1_6_new': pd.Series(np.nanmean(np.nanmean(variances[:, 0:6], axis=1), axis=0)),
+        'variances_7_12_new': pd.Series(np.nanmean(np.nanmean(variances[:, 6:12], axis=1), axis=0)),
+    }
 
 def plot_variances(all_variances, values, var_type='Regular'):
     """Plot the adjusted variances over iterations for bins 1-6 and bins 7-12 as subplots in a single figure, including a baseline at y=0."""
@@ -2,28 +2,22 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
-from tqdm import tqdm
+import os
+import sys
 from plotly.subplots import make_subplots
 
-def load_and_process_data(runs):
-    """Load data from all runs and return the means for each of the 12 bins separately."""
-    all_means = {f'means_{i}_new': [] for i in range(1, 13)}
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-    for run_number in tqdm(range(runs), desc=f'Processing runs'):
-        file_path = f'Siddharth Overwriting/Siddharth Overwriting Model/all_data_run{run_number+1}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Store the means for each bin separately
-        for i in range(1, 13):
-            all_means[f'means_{i}_new'].append(pd.Series(data[f'means_{i}_new']))
+# The overwriting model's sweep store; all runs are in one chunk
+STORE = 'Siddharth Overwriting/Siddharth Overwriting Model/store'
+STORE_KEY = 'runs'
 
-    # Average means across all runs for each bin
-    averaged_means = {key: pd.concat(value, axis=1).mean(axis=1) for key, value in all_means.items()}
-
-    return averaged_means
+def load_and_process_data(runs):
+    """Load data from all runs and return the means for each of the 12 bins separately."""
+    means = select(STORE, 'means', [STORE_KEY], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Average each bin across runs; nanmean skips missing values like pandas does
+    return {f'means_{i + 1}_new': pd.Series(np.nanmean(means[:, i], axis=0)) for i in range(12)}
 
 def plot_means(averaged_means, iterations=10000):
     """Plot the means over iterations for each of the 12 bins as subplots."""
@@ -1,7 +1,28 @@
+import copy
 import json
-import random
-import multiprocessing
-from multiprocessing import Process
+import os
+import sys
+from functools import partial
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.ensemble import OverwritingEnsemble
+from sim_core.events import OverwritingReplay, event_columns, read_events, write_events
+from sim_core.output import OutputPolicy, Recorder
+from sim_core.sampler import WordSampler
+from sim_core.seeding import as_seed_sequence, python_random, root_entropy, seed_header, streams, sweep_seed
+from sim_core.store import create_store, events_path, write_run
+from sim_core.sweep import run_batches
+from sim_core.trajectory import CHANGEPOINTS, write_changepoints, write_trajectory
+
+STAT_NAMES = ["means", "squared_means", "variances", "alt_variances"]
+# Model iterations per run
+STEPS = 10000
+# Runs advanced together by one ensemble task
+ENSEMBLE_SIZE = 20
+# Sweep store the plot scripts read; the model has no k, so all runs share one chunk
+STORE = "Siddharth Overwriting/Siddharth Overwriting Model/store"
+STORE_KEY = "runs"
 
 def reset_data():
     # Read the initial data file
@@ -25,11 +46,8 @@ def reset_data():
 
     return pivoted_data_path
 
-def process_model(run_number, pivoted_data_path):
-    # Load the processed data
-    with open(pivoted_data_path, 'r') as file:
-        words_data = json.load(file)
-
+def initial_bin_stats(words_data):
+    """Per-bin (frequency 1-12) frequency sums and the mean, squared mean and variance of the initial exemplars."""
     # Initialize a dictionary to store all means and variances
     data_dict = {
         **{f"means_{i}_new": [] for i in range(1, 13)},
@@ -65,18 +83,74 @@ def process_model(run_number, pivoted_data_path):
     for i in range(1, 13):
         data_dict[f"squared_means_{i}_new"].append(sum(squared_exemplars[i]) / len(squared_exemplars[i]))
 
+    return data_dict, frequency_sums
+
+def save_trajectories(recorded, run_number, store=None, output=None, **metadata):
+    """Writes a run's (len(STAT_NAMES), 12, recorded) array, as kept for output (full by default), into the sweep
+    store, or without one as a per-run file."""
+    output = output or OutputPolicy()
+    if store is not None:
+        write_run(store, STORE_KEY, run_number, recorded)
+        return
+    output_path = f"Siddharth Overwriting/Siddharth Overwriting Model/all_data_run{run_number + 1}.traj"
+    if output.summary:
+        write_trajectory(output_path, recorded, STAT_NAMES, run=run_number + 1, **output.header(), **metadata)
+        return
+    write_changepoints(output_path, recorded, STAT_NAMES, run=run_number + 1, **output.header(), **metadata)
+
+def events_file(run_number, store=None):
+    """Where a run's event log goes: in the sweep store, or without one beside the per-run trajectory files."""
+    if store is not None:
+        return events_path(store, STORE_KEY, run_number)
+    return f"Siddharth Overwriting/Siddharth Overwriting Model/events_run{run_number + 1}.events"
+
+def replay_model(run_number, words_data, store=STORE):
+    """Recomputes a run recorded with OutputPolicy(events=True) from its event log alone (see OverwritingReplay).
+
+    Returns the run's (len(STAT_NAMES), 12, STEPS + 1) trajectories, summed as the ensemble engine sums them
+    (so loop runs agree to rounding), and the replay, for statistics the run did not save.
+    """
+    header, events = read_events(events_file(run_number, store))
+    replay = OverwritingReplay([attributes['exemplars'] for attributes in words_data.values()],
+                               events['word'], events['source'], events['target'])
+    trajectories = bin_trajectories(words_data, np.asarray(events['word'], dtype=np.int64)[:, None],
+                                    replay.new_values[:, None], replay.replaced[:, None])
+    return trajectories[:, :, 0], replay
+
+def process_model(run_number, words_data, seed=None, store=None, output=None):
+    # The run overwrites exemplars in place, so work on its own copy of the loaded data
+    words_data = copy.deepcopy(words_data)
+    output = output or OutputPolicy()
+    data_dict, frequency_sums = initial_bin_stats(words_data)
+
+    # Separate streams for the word draws and the exemplar choices, both derived from the recorded seed
+    seed = as_seed_sequence(seed)
+    word_seed, choice_seed = streams(seed, 2)
+    rng = python_random(choice_seed)
+
+    # Word frequencies are fixed, so build the word list and sampler once
+    words_list = list(words_data.keys())
+    word_sampler = WordSampler([word_info['frequency'] for word_info in words_data.values()], np.random.default_rng(word_seed))
+    # Each step's word and the slots it copied from and overwrote, for replaying the run (see OverwritingReplay)
+    events = event_columns(STEPS, 'word', 'source', 'target') if output.events else None
+
     # Simulation loop
-    for _ in range(10000):  
-        chosen_word = random.choices(list(words_data.keys()), weights=[word_info['frequency'] for word_info in words_data.values()], k=1)[0]
+    for t in range(STEPS):
+        word = word_sampler.next()
+        chosen_word = words_list[word]
         attributes = words_data[chosen_word]
         exemplars_list = attributes['exemplars']
-        chosen_exemplar = random.choice(exemplars_list)
+        # Drawing the index draws the same numbers as rng.choice
+        source = rng.randrange(len(exemplars_list))
+        chosen_exemplar = exemplars_list[source]
 
         # Modify an exemplar and update the list
         new_exemplar = chosen_exemplar + 0.1
-        random_index = random.randrange(len(exemplars_list))
+        random_index = rng.randrange(len(exemplars_list))
         storage = exemplars_list[random_index]
         exemplars_list[random_index] = new_exemplar
+        if events is not None:
+            events['word'][t], events['source'][t], events['target'][t] = word, source, random_index
 
         freq = attributes['frequency']
         for i in range(1, 13):
@@ -104,25 +178,123 @@ def process_model(run_number, pivoted_data_path):
                 data_dict[f"variances_{i}_new"].append(data_dict[f"variances_{i}_new"][-1])
                 data_dict[f"alt_variances_{i}_new"].append(data_dict[f"alt_variances_{i}_new"][-1])
 
-    # Save all means and variances to a single JSON file
-    output_path = f"Siddharth Overwriting/Siddharth Overwriting Model/all_data_run{run_number + 1}.json"
-    with open(output_path, 'w') as file:
-        json.dump(data_dict, file)
+    # Save all means and variances to a single trajectory file
+    trajectories = np.array([[data_dict[f"{name}_{i}_new"] for i in range(1, 13)] for name in STAT_NAMES])
+    save_trajectories(output.apply(trajectories), run_number, store, output, **seed_header(seed))
+    if events is not None:
+        write_events(events_file(run_number, store), events, run=run_number + 1, **seed_header(seed))
 
     return data_dict
 
-def parallel_new_model(iterations):
+def ensemble_model(first_run, replicates, words_data, seed=None, store=None, output=None):
+    """Runs replicates first_run, first_run + 1, ... together and saves each like process_model."""
+    output = output or OutputPolicy()
+    seed = as_seed_sequence(seed)
+    rng = np.random.default_rng(seed)
+    word_sampler = WordSampler([attributes['frequency'] for attributes in words_data.values()], rng)
+    ensemble = OverwritingEnsemble([attributes['exemplars'] for attributes in words_data.values()], replicates)
+
+    # Draw every step's word and source/target uniforms up front; only the exemplar overwrites are sequential
+    words = word_sampler.draw(STEPS * replicates).reshape(STEPS, replicates)
+    uniforms = rng.random((2, STEPS, replicates))
+    new_exemplars, storage = ensemble.run(words, uniforms[0], uniforms[1])
+    # (stat, bin, replicate, recorded)
+    recorded = bin_trajectories(words_data, words, new_exemplars, storage, output)
+
+    events = None
+    if output.events:
+        # The slots the ensemble drew, relative to each word's first
+        events = event_columns(words.shape, 'word', 'source', 'target')
+        events['word'][:] = words
+        events['source'][:] = ensemble.slots(words, uniforms[0]) - ensemble.offsets[words]
+        events['target'][:] = ensemble.slots(words, uniforms[1]) - ensemble.offsets[words]
+
+    for run in range(replicates):
+        save_trajectories(recorded[:, :, run], first_run + run, store, output, engine='ensemble', replicate=run, **seed_header(seed))
+        if events is not None:
+            write_events(events_file(first_run + run, store), {name: column[:, run] for name, column in events.items()},
+                         run=first_run + run + 1, engine='ensemble', replicate=run, **seed_header(seed))
+
+def bin_trajectories(words_data, words, new_exemplars, storage, output=None):
+    """(len(STAT_NAMES), 12, replicates, recorded) array that output (full by default) keeps of the statistics
+    of runs from their (steps, replicates) words (indices into words_data) and the new exemplars and the values
+    they replaced."""
+    output = output or OutputPolicy()
+    steps, replicates = words.shape
+    word_bins = np.array([attributes['frequency'] - 1 for attributes in words_data.values()])
+    data_dict, frequency_sums = initial_bin_stats(words_data)
+    bin_sums = np.array([frequency_sums[i] for i in range(1, 13)], dtype=float)
+
+    # Per-bin state of every replicate, all starting from the same exemplars; the recorder keeps what
+    # output writes of it, so only full output holds every step's statistics
+    state = np.empty((len(STAT_NAMES), 12, replicates))
+    for row, name in zip(state, STAT_NAMES):
+        row[:] = np.array([data_dict[f"{name}_{i}_new"][0] for i in range(1, 13)])[:, None]
+    recorder = Recorder(output, state.shape, steps + 1)
+    recorder.record(state)
+
+    # Each step only changes its chosen bin, by the same increments as process_model; alternate
+    # variances keep their initial value until the bin is first chosen
+    cells = state.reshape(len(STAT_NAMES), -1)
+    r = np.arange(replicates)
+    for t in range(steps):
+        b = word_bins[words[t]]
+        chosen = b * replicates + r
+        previous_means, squared_means, variances, _ = cells[:, chosen]
+        new_exemplar, replaced, bin_sum = new_exemplars[t], storage[t], bin_sums[b]
+        means = previous_means + (new_exemplar - replaced) / bin_sum
+        squared_means = squared_means + (new_exemplar ** 2 - replaced ** 2) / bin_sum
+        # The variance update subtracts the squared mean shift first, then adds the rest
+        variances = variances - (means - previous_means) ** 2 + \
+            ((new_exemplar - previous_means) ** 2 - (replaced - previous_means) ** 2) / bin_sum
+        cells[:, chosen] = means, squared_means, variances, squared_means - means ** 2
+        recorder.record(state)
+
+    return recorder.result()
+
+def process_batch(pivoted_data_path, root, common, store, output, run_numbers):
+    # Load the processed data once for the whole batch
+    with open(pivoted_data_path, 'r') as file:
+        words_data = json.load(file)
+
+    for run_number in run_numbers:
+        process_model(run_number, words_data, sweep_seed(root, run_number, 'overwriting', common=common), store, output)
+
+def process_ensemble_batch(pivoted_data_path, runs, root, common, store, output, first_runs):
+    with open(pivoted_data_path, 'r') as file:
+        words_data = json.load(file)
+
+    for first_run in first_runs:
+        ensemble_model(first_run, min(ENSEMBLE_SIZE, runs - first_run), words_data,
+                       sweep_seed(root, first_run, 'overwriting ensemble', common=common), store, output)
+
+def parallel_new_model(iterations, num_workers=None, engine='loop', seed=None, common=False, store=STORE, output=None):
+    # output picks full, decimated or summary-only runs (see OutputPolicy); full by default
+    output = output or OutputPolicy()
     # Prepare the data once
     pivoted_data_path = reset_data()
+    # Each run's stream is keyed by its run number, so the outputs do not depend on how runs are batched;
+    # with common, run n shares its stream with run n of the decay model under the same seed
+    root = root_entropy(seed)
 
-    processes = []
-    for iter_num in range(iterations):
-        process = Process(target=process_model, args=(iter_num, pivoted_data_path,))
-        processes.append(process)
-        process.start()
+    # Without a store every run writes its own trajectory file instead
+    if store is not None:
+        if engine == 'ensemble':
+            seeds = {f"runs {first_run}-{min(first_run + ENSEMBLE_SIZE, iterations) - 1}":
+                     sweep_seed(root, first_run, 'overwriting ensemble', common=common) for first_run in range(0, iterations, ENSEMBLE_SIZE)}
+        else:
+            seeds = {f"run {run_number}": sweep_seed(root, run_number, 'overwriting', common=common) for run_number in range(iterations)}
+        # Summaries have a fixed size, so their chunk is preallocated rather than change-point encoded
+        create_store(store, [STORE_KEY], iterations, STAT_NAMES, 12, output.recorded(STEPS + 1), seeds,
+                     None if output.summary else CHANGEPOINTS, engine=engine, common=common, **output.header())
 
-    for process in processes:
-        process.join()
+    # One batch of runs per worker, at most one worker per core; the ensemble engine advances
+    # ENSEMBLE_SIZE runs per batch item instead of one
+    if engine == 'ensemble':
+        run_batches(partial(process_ensemble_batch, pivoted_data_path, iterations, root, common, store, output), range(0, iterations, ENSEMBLE_SIZE),
+                    num_workers, label='overwriting model (ensemble)', runs=iterations)
+    else:
+        run_batches(partial(process_batch, pivoted_data_path, root, common, store, output), range(iterations), num_workers, label='overwriting model')
 
 if __name__ == '__main__':
     parallel_new_model(iterations=100)
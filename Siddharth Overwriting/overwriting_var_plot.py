@@ -2,30 +2,24 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.offline as py
-import json
-from tqdm import tqdm
+import os
+import sys
 
-def load_and_process_data(runs):
-    """Load data from all runs and return the averaged variances for bins 1-6 and 7-12."""
-    all_variances = {'variances_1_6_new': [], 'variances_7_12_new': []}
-
-    for run_number in tqdm(range(runs), desc=f'Processing runs'):
-        file_path = f'Siddharth Overwriting/Siddharth Overwriting Model/all_data_run{run_number+1}.json'
-        
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        
-        # Calculate the average variance for bins 1-6 and 7-12
-        variances_1_6 = pd.concat([pd.Series(data[f'variances_{i}_new']) for i in range(1, 7)], axis=1).mean(axis=1)
-        variances_7_12 = pd.concat([pd.Series(data[f'variances_{i}_new']) for i in range(7, 13)], axis=1).mean(axis=1)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from sim_core.store import select
 
-        all_variances['variances_1_6_new'].append(variances_1_6)
-        all_variances['variances_7_12_new'].append(variances_7_12)
+# The overwriting model's sweep store; all runs are in one chunk
+STORE = 'Siddharth Overwriting/Siddharth Overwriting Model/store'
+STORE_KEY = 'runs'
 
-    # Average variances across all runs
-    averaged_variances = {key: pd.concat(value, axis=1).mean(axis=1) for key, value in all_variances.items()}
-
-    return averaged_variances
+def load_and_process_data(runs):
+    """Load data from all runs and return the averaged variances for bins 1-6 and 7-12."""
+    variances = select(STORE, 'variances', [STORE_KEY], runs=slice(0, runs))[0]  # (run, bin, iteration)
+    # Average bins 1-6 and 7-12 within each run, then across runs; nanmean skips missing values like pandas does
+    return {
+        'variances_1_6_new': pd.Series(np.nanmean(np.nanmean(variances[:, 0:6], axis=1), axis=0)),
+        'variances_7_12_new': pd.Series(np.nanmean(np.nanmean(variances[:, 6:12], axis=1), axis=0)),
+    }
 
 def plot_variances(averaged_variances, iterations=10000):
     """Plot the averaged variances for bins 1-6 and bins 7-12."""
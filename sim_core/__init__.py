@@ -0,0 +1 @@
+"""Shared building blocks for the decay and overwriting models."""
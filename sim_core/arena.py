@@ -0,0 +1,128 @@
+import numpy as np
+
+# Smallest number of slots reserved for a word's segment
+MIN_SEGMENT = 8
+
+class ExemplarArena:
+    """Exemplars of every word in flat NumPy arrays, one contiguous segment per word (CSR layout).
+
+    Each exemplar costs one float64 value, one float64 strength (or stored weight) and one int32
+    word id. A word's live exemplars sit in value[offsets[w]:offsets[w] + lengths[w]] in the order
+    they were appended, with free slots reserved up to ends[w]. Dead slots carry word id -1 and
+    strength 0, so whole-cloud updates can run over the flat arrays directly.
+
+    Only LazyDecayEngine in the Siddharth decay model keeps its exemplars here. The Shahil decay
+    scripts aggregate theirs on a ValueGrid (sim_core/grid.py), and strengths_dicts.py keeps one
+    ring of records in birth order across all words, which per-word segments cannot hold.
+    """
+
+    def __init__(self, n_words, capacity=1024):
+        self.value = np.zeros(capacity)
+        self.strength = np.zeros(capacity)
+        self.word = np.full(capacity, -1, dtype=np.int32)
+        self.offsets = np.zeros(n_words, dtype=np.int64)
+        self.lengths = np.zeros(n_words, dtype=np.int64)
+        self.ends = np.zeros(n_words, dtype=np.int64)
+        self.size = 0  # slots handed out to segments so far
+        self.moves = 0  # bumped whenever segments are relocated, so position indexes can be rebuilt
+
+    @classmethod
+    def from_lists(cls, values_per_word, strengths_per_word):
+        counts = [len(values) for values in values_per_word]
+        reserved = [max(2 * count, MIN_SEGMENT) for count in counts]
+        arena = cls(len(counts), capacity=max(sum(reserved), 1))
+        start = 0
+        for word, (values, strengths) in enumerate(zip(values_per_word, strengths_per_word)):
+            count = counts[word]
+            arena.value[start:start + count] = values
+            arena.strength[start:start + count] = strengths
+            arena.word[start:start + count] = word
+            arena.offsets[word] = start
+            arena.lengths[word] = count
+            arena.ends[word] = start + reserved[word]
+            start += reserved[word]
+        arena.size = start
+        return arena
+
+    @property
+    def n_words(self):
+        return len(self.offsets)
+
+    def segment(self, word):
+        start = self.offsets[word]
+        return slice(start, start + self.lengths[word])
+
+    def strengths(self, word):
+        return self.strength[self.segment(word)]
+
+    def append(self, word, value, strength):
+        if self.offsets[word] + self.lengths[word] == self.ends[word]:
+            self._grow(word)
+        slot = self.offsets[word] + self.lengths[word]
+        self.value[slot] = value
+        self.strength[slot] = strength
+        self.word[slot] = word
+        self.lengths[word] += 1
+        return slot
+
+    def trim_front(self, word, count):
+        """Drop the word's `count` oldest exemplars."""
+        if count <= 0:
+            return
+        start = self.offsets[word]
+        self.strength[start:start + count] = 0
+        self.word[start:start + count] = -1
+        self.offsets[word] += count
+        self.lengths[word] -= count
+
+    def live(self):
+        return self.word[:self.size] >= 0
+
+    def _grow(self, word):
+        length = self.lengths[word]
+        reserve = max(2 * length, MIN_SEGMENT)
+        if self.size + reserve > len(self.value):
+            live_count = int(self.lengths.sum())
+            if 2 * live_count < self.size:
+                self._compact()
+                return
+            if self.size + reserve > len(self.value):
+                self._resize(max(2 * len(self.value), self.size + reserve))
+
+        # Move the segment to the tail with room to double
+        start, new_start = self.offsets[word], self.size
+        self.value[new_start:new_start + length] = self.value[start:start + length]
+        self.strength[new_start:new_start + length] = self.strength[start:start + length]
+        self.word[new_start:new_start + length] = word
+        self.strength[start:start + length] = 0
+        self.word[start:start + length] = -1
+        self.offsets[word] = new_start
+        self.ends[word] = new_start + reserve
+        self.size += reserve
+        self.moves += 1
+
+    def _compact(self):
+        # Pack every live segment to the front, keeping half of each reservation free
+        reserves = np.maximum(2 * self.lengths, MIN_SEGMENT)
+        capacity = max(len(self.value), int(reserves.sum()))
+        value = np.zeros(capacity)
+        strength = np.zeros(capacity)
+        word_ids = np.full(capacity, -1, dtype=np.int32)
+        start = 0
+        for word in range(self.n_words):
+            segment, length, reserve = self.segment(word), self.lengths[word], reserves[word]
+            value[start:start + length] = self.value[segment]
+            strength[start:start + length] = self.strength[segment]
+            word_ids[start:start + length] = word
+            self.offsets[word] = start
+            self.ends[word] = start + reserve
+            start += reserve
+        self.value, self.strength, self.word = value, strength, word_ids
+        self.size = start
+        self.moves += 1
+
+    def _resize(self, capacity):
+        extra = capacity - len(self.value)
+        self.value = np.concatenate([self.value, np.zeros(extra)])
+        self.strength = np.concatenate([self.strength, np.zeros(extra)])
+        self.word = np.concatenate([self.word, np.full(extra, -1, dtype=np.int32)])
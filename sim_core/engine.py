@@ -0,0 +1,266 @@
+import csv
+import json
+import math
+from functools import partial
+
+import numpy as np
+
+from sim_core.grid import ValueGrid
+from sim_core.output import SUMMARIES, SummaryStream
+from sim_core.sampler import WordSampler
+from sim_core.seeding import job_seed, python_random, streams
+from sim_core.snapshot import cached_burn_in, is_snapshot, load_snapshot, save_snapshot
+from sim_core.store import create_store, write_run
+
+STRENGTH_THRESHOLD = 1e-6
+# To burn in to within eps of the total stable strength of a system requires at least
+# log(abs(eps * (1 - decay_rate) / (init_total_strength * (1 - decay_rate) - 1))) / log(decay_rate)
+# iterations.
+# To fill up the queue of strengths and stabilize the number of exemplars in the system requires
+# log(strength_threshold) / log(decay_rate)
+# iterations.
+# Therefore, to ensure that filling up the queue of strengths also enacts sufficient burn-in, set
+# strength_threshold < abs(eps * (1 - decay_rate) / (init_total_strength * (1 - decay_rate) - 1)).
+# Given eps = 0.01 and init_total_strength = 492, the choice of strength_threshold = 1e-6 allows
+# for sufficient burn-in for decay rates up to approx 1 - 1/10000
+# Independent burn-ins per decay rate, shared round-robin by a sweep's runs. Fixed rather than set by
+# the pool size, so which burn-in a run continues from never depends on the number of processes
+BURN_IN_SEEDS = 6
+
+class DecayEngine:
+    """The Shahil exemplar decay model over one lexicon, with words binned into frequency groups.
+
+    frequency_groups maps a word frequency to its group (indexed by frequency), e.g.
+    np.arange(13) // 7 for the 1-6 / 7-12 split. Every exemplar lives in a ValueGrid, so
+    choosing, decaying and expiring exemplars cost the same whatever statistics a script collects.
+    Word draws and exemplar choices come from separate streams derived from seed.
+    source_file is the lexicon JSON or a snapshot (see save_snapshot), e.g. an earlier run's final state.
+    """
+
+    def __init__(self, source_file, frequency_groups, strength_threshold=STRENGTH_THRESHOLD, seed=None):
+        self.source_file = source_file
+        self.strength_threshold = strength_threshold
+        if is_snapshot(source_file):
+            self.words, self.frequencies, self.grid, _ = load_snapshot(source_file)
+        else:
+            self.words, self.frequencies, self.grid = self._load_json(source_file)
+        self.n_groups = int(np.max(frequency_groups)) + 1
+        self.word_groups = [int(frequency_groups[frequency]) for frequency in self.frequencies]
+        total_frequency = sum(self.frequencies)
+        self.word_probabilities = [frequency / total_frequency for frequency in self.frequencies]
+        word_seed, choice_seed = streams(seed, 2)
+        self.word_sampler = WordSampler(self.word_probabilities, np.random.default_rng(word_seed))
+        self.random = python_random(choice_seed)
+
+    @staticmethod
+    def _load_json(source_json_file):
+        with open(source_json_file, "r") as file:
+            category_data = json.load(file)
+        values_per_word, strengths_per_word = [], []
+        for word_data in category_data.values():
+            # Lay each word's exemplars out oldest (weakest) first, so expiry only ever trims the front
+            exemplars = sorted(((float(value), strength) for value, strengths in word_data["exemplars"].items()
+                                for strength in strengths), key=lambda exemplar: exemplar[1])
+            values_per_word.append([value for value, strength in exemplars])
+            strengths_per_word.append([strength for value, strength in exemplars])
+        frequencies = [word_data["frequency"] for word_data in category_data.values()]
+        return list(category_data), frequencies, ValueGrid(values_per_word, strengths_per_word)
+
+    def iterate(self, word_sampler, decay_rate, advancement=0):
+        """One model step; returns the new exemplar's value and the chosen word's group."""
+        index = word_sampler.next()
+        # For efficiency, only remove exemplars of the chosen word, and do so before picking a target value
+        # (if all exemplars are too weak, keep the newest, i.e. strongest, one)
+        self.grid.trim_weak(index, self.strength_threshold)
+        new_exemplar_value = round(self.grid.decode(self.grid.pick(index, self.random.random())) + advancement, 1)
+        self.grid.decay(decay_rate)
+        self.grid.add(index, self.grid.encode(new_exemplar_value), 1.0)
+        return new_exemplar_value, self.word_groups[index]
+
+    def burn_in_iterations(self, decay_rate):
+        return math.ceil(math.log(self.strength_threshold) / math.log(decay_rate))
+
+    def burn_in(self, decay_rate, seed=None):
+        """Burn in with the run's own random numbers, or continue from the cached burn-in for seed."""
+        if seed is None:
+            for iteration in range(self.burn_in_iterations(decay_rate)):
+                self.iterate(self.word_sampler, decay_rate)
+            return
+        # Run and cache the burn-in for this seed on first use; continuations of one burn-in then
+        # each go on with their own run's streams
+        self.grid = cached_burn_in(self.grid, self.source_file, decay_rate, seed, self.strength_threshold,
+                                   partial(self._seeded_burn_in, decay_rate))
+
+    def _seeded_burn_in(self, decay_rate, grid, seed):
+        self.grid = grid
+        # The burn-in's own word and choice streams, split like a run's
+        word_seed, choice_seed = streams(seed, 2)
+        run_random, self.random = self.random, python_random(choice_seed)
+        word_sampler = WordSampler(self.word_probabilities, np.random.default_rng(word_seed))
+        for iteration in range(self.burn_in_iterations(decay_rate)):
+            self.iterate(word_sampler, decay_rate)
+        self.random = run_random
+
+    def measured_variances(self):
+        """Strength-weighted variance of each group measured from the grid (0 for groups with under two exemplars)."""
+        group_strengths, group_counts = self.grid.group_histograms(self.word_groups, self.n_groups)
+        values = self.grid.cell_values()
+        variances = []
+        for strengths, counts in zip(group_strengths, group_counts):
+            if counts.sum() > 1:
+                total = strengths.sum()
+                mean = np.dot(strengths, values) / total
+                variances.append(float(np.dot(strengths, (values - mean) ** 2) / total))
+            else:
+                variances.append(0.0)
+        return variances
+
+    def save_snapshot(self, path, compress=True):
+        """Writes the lexicon and its grid as a snapshot, from which a DecayEngine continues exactly."""
+        save_snapshot(path, self.words, self.frequencies, grid=self.grid, compress=compress)
+
+class GroupStats:
+    """Strength totals and strength-weighted averages of value and value**2 for each group, updated in O(1).
+
+    Seeded from the grid; afterwards the weak exemplars expired along the way are neglected.
+    """
+
+    def __init__(self, engine):
+        total_strengths, strength_weighted_values, strength_weighted_squares = \
+            engine.grid.group_moments(engine.word_groups, engine.n_groups)
+        self.total_strengths = total_strengths
+        # Avoid division by zero
+        self.average_values = np.divide(strength_weighted_values, total_strengths,
+                                        out=np.zeros(engine.n_groups), where=total_strengths > 0)
+        self.squared_averages = np.divide(strength_weighted_squares, total_strengths,
+                                          out=np.zeros(engine.n_groups), where=total_strengths > 0)
+
+    def update(self, word_group, new_exemplar_value, decay_rate):
+        self.total_strengths *= decay_rate
+        self.total_strengths[word_group] += 1
+        total = self.total_strengths[word_group]
+        self.average_values[word_group] = (self.average_values[word_group] * (total - 1) + new_exemplar_value) / total
+        self.squared_averages[word_group] = (self.squared_averages[word_group] * (total - 1) + new_exemplar_value ** 2) / total
+
+    def variances(self):
+        # E[x^2] - E[x]^2, clipped at the rounding floor
+        return np.maximum(self.squared_averages - self.average_values ** 2, 0.0)
+
+class GroupAverages:
+    """Collects the strength-weighted average value of each group."""
+
+    # Name of the collected statistic in a sweep store
+    stat = "averages"
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def start(self, engine, stats):
+        return stats.average_values.tolist()
+
+    def record(self, stats):
+        return stats.average_values.tolist()
+
+class GroupVariances:
+    """Collects the strength-weighted variance of each group.
+
+    The first row is the variance measured after burn-in (or zeros without measure_start); with
+    relative, later rows report the change since then.
+    """
+
+    stat = "variances"
+
+    def __init__(self, columns, measure_start=True, relative=False):
+        self.columns = columns
+        self.measure_start = measure_start
+        self.relative = relative
+
+    def start(self, engine, stats):
+        self.initial_variances = engine.measured_variances() if self.measure_start else [0.0] * engine.n_groups
+        return list(self.initial_variances)
+
+    def record(self, stats):
+        variances = stats.variances()
+        if self.relative:
+            variances = variances - self.initial_variances
+        return variances.tolist()
+
+def run_model(engine, iterations, decay_rate, advancement, save_every, collectors, stream=None):
+    """Rows of the collected statistics: one at the start, then one every save_every iterations.
+
+    With a stream (see SummaryStream) each row is fed to it as it is collected and none are kept.
+    """
+    stats = GroupStats(engine)
+    rows = []
+    record = rows.append if stream is None else stream.update
+    record([value for collector in collectors for value in collector.start(engine, stats)])
+    for iteration in range(iterations):
+        new_exemplar_value, word_group = engine.iterate(engine.word_sampler, decay_rate, advancement)
+        stats.update(word_group, new_exemplar_value, decay_rate)
+        if iteration % save_every == 0:
+            record([value for collector in collectors for value in collector.record(stats)])
+    return rows
+
+def run_times(iterations, save_every):
+    """Model steps taken by each row of run_model: none at the start, then iteration + 1 for each recorded iteration."""
+    return np.array([0] + [iteration + 1 for iteration in range(0, iterations, save_every)])
+
+def run_rows(iterations, save_every):
+    """Number of rows run_model returns: the start, then one every save_every iterations."""
+    return 1 + len(range(0, iterations, save_every))
+
+def create_sweep_store(store, keys, runs, frequency_groups, collectors, iterations, output, seeds=None):
+    """Preallocates the store process_run writes into: for each key a (run, collector, group, row) chunk,
+    or (run, collector, group, summary) with a summary-only output policy."""
+    length = len(SUMMARIES) if output.summary else run_rows(iterations, output.stride)
+    create_store(store, keys, runs, [collector.stat for collector in collectors], int(np.max(frequency_groups)) + 1,
+                 length, seeds, **output.header())
+
+def burn_in_seed(root, decay_rate, run, common=False):
+    """The SeedSequence of the burn-in run continues from: one of BURN_IN_SEEDS per decay rate, derived from the sweep's root.
+
+    Under common random numbers every decay rate burns in from the same BURN_IN_SEEDS streams, like the runs.
+    """
+    key = ('burn-in', run % BURN_IN_SEEDS) if common else ('burn-in', decay_rate, run % BURN_IN_SEEDS)
+    return job_seed(root, *key)
+
+def run_cost(iterations, decay_rate, burn_in, strength_threshold=STRENGTH_THRESHOLD):
+    """Relative cost of a run in model steps, for scheduling; the burn-in is what grows with the decay rate."""
+    return iterations + (math.ceil(math.log(strength_threshold) / math.log(decay_rate)) if burn_in else 0)
+
+def process_run(source_file, frequency_groups, collectors, iterations, decay_rate, advancement, output,
+                burn_in, burn_in_seed, output_snapshot_file_name, output_average_file_name, seed=None, store=None, key=None,
+                run=None, compress=True):
+    """One full run: load, optionally burn in, run, and save the final state as a snapshot and the collected statistics.
+
+    output (an OutputPolicy) sets how often rows are collected, or with mode 'summary' that only
+    their summaries are kept, one CSV row per summary. With a store (see create_sweep_store), the
+    statistics go into run's block of the key's chunk instead of the CSV file. The final state
+    snapshot (compressed unless compress is false) can be passed back as a later run's source_file.
+    """
+    if output.events:
+        raise ValueError("The Shahil engines do not record event logs")
+    engine = DecayEngine(source_file, frequency_groups, seed=seed)
+    if burn_in:
+        engine.burn_in(decay_rate, burn_in_seed)
+    stream = None
+    if output.summary:
+        stream = SummaryStream(len(collectors) * engine.n_groups, run_times(iterations, output.stride), output.tail)
+    rows = run_model(engine, iterations, decay_rate, advancement, output.stride, collectors, stream)
+
+    engine.save_snapshot(output_snapshot_file_name, compress)
+    # (column, row) array of the statistics, or (column, summary) of their summaries
+    columns = np.array(rows).T if stream is None else stream.result()
+    if store is not None:
+        # Each collector's columns are one value per group
+        write_run(store, key, run, columns.reshape(len(collectors), engine.n_groups, -1))
+        return
+    with open(output_average_file_name, 'w', newline="") as out_file:
+        writer = csv.writer(out_file)
+        header = [column for collector in collectors for column in collector.columns]
+        if stream is None:
+            writer.writerow(header)
+            writer.writerows(rows)
+            return
+        writer.writerow(['summary'] + header)
+        writer.writerows([summary] + values.tolist() for summary, values in zip(SUMMARIES, columns.T))
@@ -0,0 +1,207 @@
+import numpy as np
+
+# Smallest number of slots reserved for a word
+MIN_CAPACITY = 8
+# Newest exemplars, and oldest live ones, checked directly before searching a whole region
+CHOICE_WINDOW = 32
+EXPIRY_WINDOW = 8
+
+class DecayEnsemble:
+    """R replicates of the decay model advanced in lockstep as (replicate, slot) arrays.
+
+    Every replicate shares one slot layout: word w owns the columns offsets[w]:offsets[w] +
+    capacities[w], and its live exemplars in replicate r are the columns heads[r, w]:tails[r, w]
+    of that region, oldest first. Strengths decay lazily as in the single-run engine: a stored
+    weight w stands for w * scale * word_scale[r, word], and since all replicates take the same
+    number of steps they share the global scale. As in process_old_model, the chosen word's
+    existing exemplars are not decayed on the step it is chosen.
+
+    Stored weights ascend with birth, and cumulative holds their running sums from the start of
+    each region, so a choice and the expiry of the oldest exemplars are both searches in one
+    region. Both arrays are the imaginary parts of complex keys whose real part numbers the
+    (replicate, word) region, with unused slots at infinity; the keys then ascend over the whole
+    flattened array. A step compares every replicate's query with a short window of keys at
+    once, and one np.searchsorted over the flattened keys finds the slots of the replicates
+    whose answer lies outside their window.
+    """
+    # Fold the scale factors back into the stored weights before they leave float range
+    RENORMALIZE_BELOW = 1e-150
+
+    def __init__(self, values_per_word, strengths_per_word, k, replicates, threshold):
+        self.k = k
+        self.threshold = threshold
+        self.replicates = replicates
+        counts = np.array([len(values) for values in values_per_word])
+        self._layout(np.maximum(2 * counts, MIN_CAPACITY))
+        for word, (values, strengths) in enumerate(zip(values_per_word, strengths_per_word)):
+            start = self.offsets[word]
+            self.values[:, start:start + len(values)] = values
+            self.weights[:, start:start + len(values)] = strengths
+            self.cumulative[:, start:start + len(values)] = np.cumsum(strengths)
+        self.heads = np.zeros((replicates, len(counts)), dtype=np.int64)
+        self.tails = np.tile(counts, (replicates, 1))
+
+        self.scale = 1.0
+        self.word_scale = np.ones((replicates, len(counts)))
+        self.replicate_ids = np.arange(replicates)
+        self.region_ids = self.replicate_ids * len(counts)
+        self.choice_offsets = np.arange(CHOICE_WINDOW)
+        self.expiry_offsets = np.arange(EXPIRY_WINDOW)
+
+    def _layout(self, capacities):
+        """Empty value and key arrays for regions of the given capacities, with their offsets."""
+        self.capacities = capacities
+        self.offsets = np.concatenate([[0], np.cumsum(capacities)[:-1]])
+        size = int(capacities.sum())
+        self.row_offsets = np.arange(self.replicates) * size
+        regions = np.arange(self.replicates)[:, None] * len(capacities) + np.repeat(np.arange(len(capacities)), capacities)
+        self.values = np.zeros((self.replicates, size))
+        self.weight_keys, self.sum_keys = np.empty((2, self.replicates, size), dtype=complex)
+        for keys in (self.weight_keys, self.sum_keys):
+            keys.real, keys.imag = regions, np.inf
+        self.weights, self.cumulative = self.weight_keys.imag, self.sum_keys.imag
+
+    def step(self, words, uniforms):
+        """Advance every replicate by one iteration; returns the new exemplar values and the ages of the
+        exemplars they copy (0 for a word's newest)."""
+        # Flat indices of each replicate's chosen word in the (replicate, word) arrays, and of its
+        # region and newest exemplar in the (replicate, slot) ones
+        regions = self.region_ids + words
+        heads, tails = self.heads.reshape(-1)[regions], self.tails.reshape(-1)[regions]
+        starts = self.row_offsets + self.offsets[words]
+        newest = starts + tails - 1
+        sum_keys, weight_keys = self.sum_keys.reshape(-1), self.weight_keys.reshape(-1)
+        cumulative = sum_keys.imag
+
+        # Weighted choice with the same rule as random.choices, one uniform per replicate, over the
+        # running sums of the live exemplars (those past the sum of the expired ones before them).
+        # The newest exemplars carry most of the weight, so the choice usually lands in a short
+        # window before the newest, and only the rest search their whole region
+        before = np.where(heads > 0, cumulative[starts + heads - 1], 0.0)
+        total = cumulative[newest]
+        queries = regions + 1j * (before + uniforms * (total - before))
+        above = sum_keys.take(newest[:, None] - self.choice_offsets, mode='clip') > queries[:, None]
+        chosen = np.minimum(newest + 1 - above.argmin(axis=1), newest)
+        beyond = np.flatnonzero(above[:, -1])
+        if len(beyond):
+            chosen[beyond] = np.searchsorted(sum_keys, queries[beyond], side='right')
+        new_values = self.values.reshape(-1).take(chosen) + 0.1
+        ages = newest - chosen
+
+        self.scale *= self.k
+        word_scale = self.word_scale.reshape(-1)[regions] / self.k
+        self.word_scale.reshape(-1)[regions] = word_scale
+        factors = self.scale * word_scale
+
+        # Expired exemplars are the oldest of the chosen word, and every one expired before is weaker
+        # still, so the new head is the first stored weight above the threshold: usually a few past
+        # the old one, else found by searching the region
+        queries = regions + 1j * (self.threshold / factors)
+        expired = weight_keys.take((starts + heads)[:, None] + self.expiry_offsets, mode='clip') < queries[:, None]
+        heads += expired.argmin(axis=1)
+        beyond = np.flatnonzero(expired[:, -1])
+        if len(beyond):
+            heads[beyond] = np.searchsorted(weight_keys, queries[beyond]) - starts[beyond]
+        self.heads.reshape(-1)[regions] = heads
+
+        # The new exemplars go after the newest, once full regions are packed or grown
+        weights = 1 / factors
+        full = tails == self.capacities[words]
+        if full.any():
+            self._make_room(self.replicate_ids[full], words[full])
+            tails = self.tails.reshape(-1)[regions]
+            newest = self.row_offsets + self.offsets[words] + tails - 1
+            cumulative = self.cumulative.reshape(-1)
+            total = np.where(tails > 0, cumulative[newest], 0.0)
+        self.values.reshape(-1)[newest + 1] = new_values
+        self.weights.reshape(-1)[newest + 1] = weights
+        cumulative[newest + 1] = total + weights
+        self.tails.reshape(-1)[regions] = tails + 1
+
+        if self.scale < self.RENORMALIZE_BELOW:
+            self.renormalize()
+
+        return new_values, ages
+
+    def renormalize(self):
+        for word in range(len(self.offsets)):
+            start = self.offsets[word]
+            region = slice(start, start + self.capacities[word])
+            self.weights[:, region] *= (self.scale * self.word_scale[:, word])[:, None]
+            self.cumulative[:, region] = np.cumsum(self.weights[:, region], axis=1)
+        self.word_scale[:] = 1.0
+        self.scale = 1.0
+
+    def _make_room(self, replicates, words):
+        # Rows that are mostly expired are packed to the front of their region; any other
+        # full row forces its word's region to double for every replicate
+        for word in np.unique(words):
+            rows = replicates[words == word]
+            if (self.heads[rows, word] < self.capacities[word] // 2).any():
+                self._grow(word)
+            else:
+                self._compact(rows, word)
+
+    def _compact(self, replicates, word):
+        start = self.offsets[word]
+        for r in replicates:
+            head, tail = self.heads[r, word], self.tails[r, word]
+            length = tail - head
+            self.values[r, start:start + length] = self.values[r, start + head:start + tail]
+            self.values[r, start + length:start + tail] = 0.0
+            self.weights[r, start:start + length] = self.weights[r, start + head:start + tail]
+            self.weights[r, start + length:start + tail] = np.inf
+            self.cumulative[r, start:start + length] = np.cumsum(self.weights[r, start:start + length])
+            self.cumulative[r, start + length:start + tail] = np.inf
+            self.heads[r, word], self.tails[r, word] = 0, length
+
+    def _grow(self, word):
+        old_capacities, old_offsets = self.capacities, self.offsets
+        old = self.values, self.weights, self.cumulative
+        capacities = old_capacities.copy()
+        capacities[word] *= 2
+        self._layout(capacities)
+        for old_array, new_array in zip(old, (self.values, self.weights, self.cumulative)):
+            for w in range(len(capacities)):
+                new_array[:, self.offsets[w]:self.offsets[w] + old_capacities[w]] = \
+                    old_array[:, old_offsets[w]:old_offsets[w] + old_capacities[w]]
+
+class OverwritingEnsemble:
+    """R replicates of the overwriting model advanced in lockstep on a dense (replicate, slot) array.
+
+    Every word keeps a fixed number of exemplars, so word w owns the columns offsets[w]:offsets[w] +
+    counts[w] in every replicate. A step copies a uniformly chosen exemplar of each replicate's
+    chosen word, plus 0.1, over a uniformly chosen slot of the same word.
+    """
+
+    def __init__(self, exemplars_per_word, replicates):
+        self.replicates = replicates
+        self.counts = np.array([len(exemplars) for exemplars in exemplars_per_word])
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        self.values = np.tile(np.concatenate([np.asarray(exemplars, dtype=float) for exemplars in exemplars_per_word]),
+                              (replicates, 1))
+
+    def slots(self, words, uniforms):
+        """Columns of uniformly chosen exemplars of the given words; floor(u * n) like random.choice."""
+        counts = self.counts[words]
+        return self.offsets[words] + np.minimum((uniforms * counts).astype(np.int64), counts - 1)
+
+    def run(self, words, source_uniforms, target_uniforms):
+        """Advance every replicate through the (steps, replicates) draws.
+
+        Returns the (steps, replicates) arrays of new exemplar values and of the values they replaced.
+        """
+        sources = self.slots(words, source_uniforms)
+        targets = self.slots(words, target_uniforms)
+        new_values = np.empty(words.shape)
+        replaced = np.empty(words.shape)
+        r = np.arange(self.replicates)
+        for t in range(len(words)):
+            replaced[t] = self.values[r, targets[t]]
+            new_values[t] = self.values[r, sources[t]] + 0.1
+            self.values[r, targets[t]] = new_values[t]
+        return new_values, replaced
+
+    def exemplars(self, replicate, word):
+        start = self.offsets[word]
+        return self.values[replicate, start:start + self.counts[word]]
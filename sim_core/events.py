@@ -0,0 +1,166 @@
+import os
+
+import numpy as np
+
+from sim_core.trajectory import ALIGNMENT, read_header, write_json_header
+
+# An event log records what each step of a run chose, which is all a replay needs besides the
+# initial lexicon: no random numbers are drawn again. File layout: magic, header length, JSON header
+# (metadata, column names and dtypes, steps), then each column's raw little-endian integers, each
+# starting at a 64-byte boundary
+MAGIC = b'SDSEVNT1'
+EXTENSION = '.events'
+
+def narrow_dtype(bound):
+    """The narrower of uint16 and uint32 that holds every value below bound."""
+    return np.dtype('<u2') if bound <= 1 << 16 else np.dtype('<u4')
+
+def event_columns(shape, *names):
+    """Preallocated uint32 columns, one per name, with shape the number of steps, or (steps, replicates) for an ensemble."""
+    return {name: np.zeros(shape, dtype='<u4') for name in names}
+
+def write_events(path, columns, **metadata):
+    """Writes (steps,) integer columns with a JSON header of run metadata, each in the narrowest dtype holding its values."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    columns = {name: np.ascontiguousarray(column, dtype=narrow_dtype(int(np.max(column, initial=0)) + 1))
+               for name, column in columns.items()}
+    steps = len(next(iter(columns.values()))) if columns else 0
+    with open(path, 'wb') as f:
+        write_json_header(f, {**metadata, 'columns': list(columns), 'dtypes': [column.dtype.str for column in columns.values()],
+                              'steps': steps}, MAGIC)
+        for column in columns.values():
+            f.write(column.tobytes())
+            f.write(b'\0' * (-column.nbytes % ALIGNMENT))
+
+def read_events(path):
+    """Returns (header, {column name: read-only memory map of the column})."""
+    with open(path, 'rb') as f:
+        header, offset = read_header(f, MAGIC)
+    columns = {}
+    for name, dtype in zip(header['columns'], header['dtypes']):
+        columns[name] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(header['steps'],))
+        offset += columns[name].nbytes + (-columns[name].nbytes % ALIGNMENT)
+    return header, columns
+
+def chain_values(initial, parents, advancement):
+    """Values of exemplars made by copying: ids below len(initial) hold the initial values, and
+    id len(initial) + t, the copy made at step t, holds the value of id parents[t] plus advancement.
+
+    Copies are grouped by generation (their number of copies from an initial value), found by
+    pointer jumping, and each generation is computed in one vectorized step, so the values are
+    bitwise those of the sequential copies.
+    """
+    n = len(initial)
+    parents = np.asarray(parents, dtype=np.int64)
+    # Every id points at an ancestor and counts the copies to it; initial ids point at themselves
+    ancestors = np.concatenate([np.arange(n), parents])
+    generations = np.concatenate([np.zeros(n, dtype=np.int64), np.ones(len(parents), dtype=np.int64)])
+    while (ancestors >= n).any():
+        generations = generations + generations[ancestors]
+        ancestors = ancestors[ancestors]
+
+    values = np.empty(n + len(parents))
+    values[:n] = initial
+    order = np.argsort(generations[n:], kind='stable')
+    bounds = np.searchsorted(generations[n:][order], np.arange(1, generations.max(initial=0) + 2))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        copies = order[start:stop]
+        values[n + copies] = values[parents[copies]] + advancement
+    return values
+
+class DecayReplay:
+    """Reconstructs a decay-model run from its initial exemplars and its event log.
+
+    The log holds each step's word and the age of the exemplar it copied (0 for the word's newest
+    live exemplar). Exemplars are numbered with the initial ones first, in lexicon order, then the
+    one born at step t as len(initial) + t; values holds every exemplar's value, new_values those
+    born at each step, and cloud(t) gives the live exemplars after t steps, from which any
+    statistic (another binning, higher moments, per-word series) can be computed.
+    """
+
+    def __init__(self, values_per_word, strengths_per_word, words, ages, k, threshold, advancement=0.1):
+        self.k = k
+        self.threshold = threshold
+        self.counts = np.array([len(values) for values in values_per_word])
+        offsets = np.concatenate([[0], np.cumsum(self.counts)[:-1]]).astype(np.int64)
+        self.initial_words = np.repeat(np.arange(len(self.counts)), self.counts)
+        self.initial_strengths = np.concatenate([np.asarray(strengths, dtype=float) for strengths in strengths_per_word])
+        n = len(self.initial_words)
+        self.words = np.asarray(words, dtype=np.int64)
+
+        # The j-th choice of word w (counting from 0) finds counts[w] + j exemplars born so far, the
+        # newest at age 0; births past the initial ones are the word's earlier choices, in order
+        self.order = np.argsort(self.words, kind='stable')
+        self.starts = np.searchsorted(self.words[self.order], np.arange(len(self.counts) + 1))
+        self.occurrences = np.empty(len(self.words), dtype=np.int64)
+        self.occurrences[self.order] = np.arange(len(self.words)) - self.starts[self.words[self.order]]
+        counts = self.counts[self.words]
+        ranks = counts + self.occurrences - 1 - np.asarray(ages, dtype=np.int64)
+        born = self.order[self.starts[self.words] + np.maximum(ranks - counts, 0)]
+        parents = np.where(ranks < counts, offsets[self.words] + ranks, n + born)
+
+        self.values = chain_values(np.concatenate([np.asarray(values, dtype=float) for values in values_per_word]),
+                                   parents, advancement)
+        self.new_values = self.values[n:]
+
+    def cloud(self, t):
+        """(words, values, strengths) of the exemplars alive after t steps.
+
+        Strengths follow the engines: every word decays by k each step except on the steps that
+        choose it, which also drop its exemplars below threshold. They are computed in closed form,
+        so they agree with the run's only to rounding.
+        """
+        n = len(self.initial_words)
+        words = np.concatenate([self.initial_words, self.words[:t]])
+        # Steps and choices of its word before each exemplar's birth, and its strength then
+        births = np.concatenate([np.zeros(n, dtype=np.int64), np.arange(1, t + 1)])
+        choices = np.concatenate([np.zeros(n, dtype=np.int64), self.occurrences[:t] + 1])
+        strengths = np.concatenate([self.initial_strengths, np.ones(t)])
+
+        chosen = np.bincount(self.words[:t], minlength=len(self.counts))
+        decays = (t - births) - (chosen[words] - choices)
+        # Exemplars are only dropped when their word is chosen, and steps since then all decay
+        last = np.where(chosen > 0, self.order[self.starts[:-1] + chosen - 1], -1)
+        since = t - 1 - last[words]
+        checked = last[words] >= np.maximum(births - 1, 0)
+        live = ~checked | (strengths * self.k ** (decays - since) >= self.threshold)
+        return words[live], self.values[:n + t][live], (strengths * self.k ** decays)[live]
+
+class OverwritingReplay:
+    """Reconstructs an overwriting-model run from its initial exemplars and its event log.
+
+    The log holds each step's word and the slots (within the word) of the exemplar it copied and of
+    the one it overwrote. new_values and replaced hold each step's written and overwritten values,
+    which give running sums of any moment over any grouping of words, and state(t) holds every
+    slot's value after t steps.
+    """
+
+    def __init__(self, exemplars_per_word, words, sources, targets, advancement=0.1):
+        counts = np.array([len(exemplars) for exemplars in exemplars_per_word])
+        self.offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        initial = np.concatenate([np.asarray(exemplars, dtype=float) for exemplars in exemplars_per_word])
+        self.slot_count = len(initial)
+        words = np.asarray(words, dtype=np.int64)
+        self.targets = self.offsets[words] + np.asarray(targets, dtype=np.int64)
+
+        # Writes sorted by slot, then step, so the last write to a slot before a step is found by bisection
+        self.steps = len(words)
+        self.write_order = np.argsort(self.targets, kind='stable')
+        self.write_keys = self.targets[self.write_order] * (self.steps + 1) + self.write_order
+
+        step_numbers = np.arange(self.steps)
+        self.values = chain_values(initial, self.holding(self.offsets[words] + np.asarray(sources, dtype=np.int64), step_numbers),
+                                   advancement)
+        self.new_values = self.values[self.slot_count:]
+        self.replaced = self.values[self.holding(self.targets, step_numbers)]
+
+    def holding(self, slots, steps):
+        """Ids (as in chain_values) of the values the slots hold just before the steps."""
+        positions = np.searchsorted(self.write_keys, slots * (self.steps + 1) + steps, side='left') - 1
+        writes = self.write_order[np.maximum(positions, 0)]
+        written = (positions >= 0) & (self.targets[writes] == slots)
+        return np.where(written, self.slot_count + writes, slots)
+
+    def state(self, t):
+        """Value of every slot after t steps, words in lexicon order."""
+        return self.values[self.holding(np.arange(self.slot_count), np.full(self.slot_count, t))]
@@ -0,0 +1,50 @@
+class FenwickTree:
+    """Binary indexed tree over non-negative weights.
+
+    Point updates, prefix sums and weighted selection all cost O(log n). The tree is kept in a
+    plain list because every operation touches only a handful of scalars.
+    """
+
+    def __init__(self, weights=(), capacity=0):
+        size = 1
+        while size < max(len(weights), capacity):
+            size *= 2
+        self.size = size
+        self.tree = [0.0] * (size + 1)
+        self.tree[1:len(weights) + 1] = [float(weight) for weight in weights]
+
+        # Build in O(n) by pushing each node's sum up to its parent
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, index):
+        """Sum of the weights at positions below index."""
+        total = 0.0
+        i = index
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def total(self):
+        return self.tree[self.size]
+
+    def find(self, target):
+        """Smallest position whose cumulative weight exceeds target."""
+        position = 0
+        step = self.size
+        while step:
+            next_position = position + step
+            if next_position <= self.size and self.tree[next_position] <= target:
+                position = next_position
+                target -= self.tree[next_position]
+            step //= 2
+        return position
@@ -0,0 +1,163 @@
+import numpy as np
+
+from sim_core.ring import RingBuffer
+
+# Every new exemplar value is rounded to one decimal, so values are stored as integer codes
+# value * CELLS_PER_UNIT (int16 range)
+CELLS_PER_UNIT = 10
+# Free cells kept on either side of the occupied codes when the grid is (re)allocated
+GRID_MARGIN = 64
+# Fields of each word's exemplar queue
+EXEMPLAR_FIELDS = {'code': np.int16, 'weight': np.float64}
+
+class ValueGrid:
+    """Exemplar strengths of every word aggregated on the 0.1 value grid, under one lazy decay scale.
+
+    weights[w, c] holds the summed stored weight of word w's exemplars whose code is origin + c,
+    and counts[w, c] how many live exemplars that is. A stored weight stands for the strength
+    weight * scale, so decaying every exemplar only touches the scale. Each word also keeps its
+    exemplars' codes and weights in a ring buffer in birth order, i.e. weakest first, so expiry
+    trims the front.
+    """
+    # Fold the scale back into the stored weights before it leaves float range
+    RENORMALIZE_BELOW = 1e-150
+
+    def __init__(self, values_per_word, strengths_per_word):
+        """Exemplars of each word must be given oldest (weakest) first."""
+        codes_per_word = [[self.encode(value) for value in values] for values in values_per_word]
+        all_codes = [code for codes in codes_per_word for code in codes] or [0]
+        self.origin = min(all_codes) - GRID_MARGIN
+        width = max(all_codes) - min(all_codes) + 1 + 2 * GRID_MARGIN
+        self.weights = np.zeros((len(codes_per_word), width))
+        self.counts = np.zeros((len(codes_per_word), width), dtype=np.int32)
+        self.scale = 1.0
+        self.exemplars = [RingBuffer(EXEMPLAR_FIELDS, capacity=2 * len(codes)) for codes in codes_per_word]
+        for word, (codes, strengths) in enumerate(zip(codes_per_word, strengths_per_word)):
+            for code, strength in zip(codes, strengths):
+                self.add(word, code, strength)
+
+    @classmethod
+    def from_state(cls, state):
+        """Rebuild a grid from the arrays returned by state()."""
+        grid = cls.__new__(cls)
+        grid.weights = np.array(state['weights'], dtype=np.float64)
+        grid.counts = np.array(state['counts'], dtype=np.int32)
+        grid.origin = int(state['origin'])
+        grid.scale = float(state['scale'])
+        grid.exemplars = []
+        ends = np.cumsum(state['lengths'])
+        for start, end in zip(ends - state['lengths'], ends):
+            exemplars = RingBuffer(EXEMPLAR_FIELDS, capacity=2 * (end - start))
+            exemplars.extend(code=state['codes'][start:end], weight=state['exemplar_weights'][start:end])
+            grid.exemplars.append(exemplars)
+        return grid
+
+    def state(self):
+        """The grid as a dict of arrays (for np.savez); from_state() restores it exactly."""
+        return {'weights': self.weights, 'counts': self.counts,
+                'origin': np.int64(self.origin), 'scale': np.float64(self.scale),
+                'lengths': np.array([len(exemplars) for exemplars in self.exemplars], dtype=np.int64),
+                'codes': np.concatenate([exemplars.field('code') for exemplars in self.exemplars]),
+                'exemplar_weights': np.concatenate([exemplars.field('weight') for exemplars in self.exemplars])}
+
+    @staticmethod
+    def encode(value):
+        return int(round(value * CELLS_PER_UNIT))
+
+    @staticmethod
+    def decode(code):
+        return code / CELLS_PER_UNIT
+
+    @property
+    def n_words(self):
+        return len(self.exemplars)
+
+    def cell_values(self):
+        return (self.origin + np.arange(self.weights.shape[1])) / CELLS_PER_UNIT
+
+    def add(self, word, code, strength):
+        cell = code - self.origin
+        if not 0 <= cell < self.weights.shape[1]:
+            self._regrid(code)
+            cell = code - self.origin
+        weight = strength / self.scale
+        self.weights[word, cell] += weight
+        self.counts[word, cell] += 1
+        self.exemplars[word].append(code=code, weight=weight)
+
+    def trim_weak(self, word, threshold):
+        """Drop the word's exemplars with strength <= threshold, keeping at least the newest one.
+
+        Returns the codes that were dropped, oldest first.
+        """
+        exemplars = self.exemplars[word]
+        count = min(exemplars.count_at_most('weight', threshold / self.scale), len(exemplars) - 1)
+        if count <= 0:
+            return []
+        expired = exemplars.pop_front(count)
+        cells = expired['code'].astype(np.int64) - self.origin
+        np.subtract.at(self.counts[word], cells, 1)
+        np.subtract.at(self.weights[word], cells, expired['weight'])
+        # Reset emptied cells exactly rather than leave rounding residue behind
+        self.weights[word, cells[self.counts[word, cells] == 0]] = 0.0
+        return expired['code'].tolist()
+
+    def pick(self, word, u):
+        """Code chosen with probability proportional to the word's strength in each cell.
+
+        Same rule as random.choices: the first cumulative weight above u * total.
+        """
+        cumulative = np.cumsum(self.weights[word])
+        cell = np.searchsorted(cumulative, u * cumulative[-1], side='right')
+        if cell == len(cumulative):  # rounding at the top end
+            cell = np.flatnonzero(self.weights[word])[-1]
+        return self.origin + int(cell)
+
+    def decay(self, rate):
+        self.scale *= rate
+        if self.scale < self.RENORMALIZE_BELOW:
+            self.renormalize()
+
+    def renormalize(self):
+        self.weights *= self.scale
+        for exemplars in self.exemplars:
+            exemplars.arrays['weight'] *= self.scale
+        self.scale = 1.0
+
+    def word_moments(self):
+        """Strength totals and strength-weighted sums of value and value**2 for each word."""
+        values = self.cell_values()
+        total = self.weights.sum(axis=1) * self.scale
+        weighted = self.weights @ values * self.scale
+        weighted_squares = self.weights @ values ** 2 * self.scale
+        return total, weighted, weighted_squares
+
+    def group_moments(self, word_groups, n_groups):
+        """Strength totals and strength-weighted sums of value and value**2 for each group of words."""
+        word_groups = np.asarray(word_groups)
+        return tuple(np.bincount(word_groups, weights=moment, minlength=n_groups) for moment in self.word_moments())
+
+    def group_histograms(self, word_groups, n_groups):
+        """Strength and exemplar count in each cell for each group of words."""
+        strengths = np.zeros((n_groups, self.weights.shape[1]))
+        counts = np.zeros((n_groups, self.weights.shape[1]), dtype=np.int64)
+        np.add.at(strengths, np.asarray(word_groups), self.weights * self.scale)
+        np.add.at(counts, np.asarray(word_groups), self.counts)
+        return strengths, counts
+
+    def _regrid(self, code):
+        # Reallocate so that the occupied codes plus the new one sit GRID_MARGIN cells from either edge
+        occupied = np.flatnonzero(self.counts.any(axis=0))
+        low = min(code, self.origin + occupied[0]) if len(occupied) else code
+        high = max(code, self.origin + occupied[-1]) if len(occupied) else code
+        origin = low - GRID_MARGIN
+        width = max(high - low + 1 + 2 * GRID_MARGIN, self.weights.shape[1])
+        weights = np.zeros((self.n_words, width))
+        counts = np.zeros((self.n_words, width), dtype=np.int32)
+        if len(occupied):
+            old = slice(occupied[0], occupied[-1] + 1)
+            start = self.origin + occupied[0] - origin
+            new = slice(start, start + occupied[-1] - occupied[0] + 1)
+            weights[:, new] = self.weights[:, old]
+            counts[:, new] = self.counts[:, old]
+        self.weights, self.counts, self.origin = weights, counts, origin
@@ -0,0 +1,125 @@
+import numpy as np
+
+# Summaries written per (stat, bin) in summary mode, in this order along the last axis
+SUMMARIES = ['slope', 'tail_mean', 'final']
+MODES = ('full', 'stride', 'summary')
+
+class OutputPolicy:
+    """What each run of an engine writes.
+
+    'full' records every iteration, 'stride' every stride-th one, and 'summary' only, for each
+    (stat, bin), the least-squares drift slope, the mean over the last tail iterations and the final
+    value (see SummaryStream). In summary mode stride sets how often the series is sampled, which the
+    Shahil engines use in place of save_every. With events, the Siddharth engines also write each
+    run's event log, from which sim_core/events.py replays statistics the run did not record.
+    """
+
+    def __init__(self, mode='full', stride=1, tail=1000, events=False):
+        if mode not in MODES:
+            raise ValueError(f"Unknown output mode: {mode}")
+        self.mode = mode
+        self.stride = 1 if mode == 'full' else stride
+        self.tail = tail
+        self.events = events
+
+    @property
+    def summary(self):
+        return self.mode == 'summary'
+
+    def recorded(self, length):
+        """Length of the last axis a run writes, for a run of length recorded iterations."""
+        return len(SUMMARIES) if self.summary else len(range(0, length, self.stride))
+
+    def apply(self, trajectories):
+        """The (..., recorded) array a run writes, from its (..., iterations) trajectories."""
+        sampled = trajectories[..., ::self.stride]
+        if not self.summary:
+            return sampled
+        stream = SummaryStream(sampled.shape[:-1], np.arange(trajectories.shape[-1])[::self.stride], self.tail)
+        stream.update(sampled)
+        return stream.result()
+
+    def header(self):
+        """Output metadata for trajectory headers and sweep stores."""
+        header = {'output': self.mode, 'stride': self.stride, 'events': self.events}
+        if self.summary:
+            header.update(tail=self.tail, summaries=SUMMARIES)
+        return header
+
+class Recorder:
+    """Takes a run's columns one iteration at a time and keeps what output writes of them.
+
+    Every stride-th column is copied into a (block, *shape) buffer, one contiguous row per
+    iteration; a full buffer is moved into the preallocated (*shape, recorded) array in full and
+    stride modes, or passed to a SummaryStream in summary mode, so the memory held there does not
+    grow with the run. result() is then what output.apply gives for the dense trajectories.
+    """
+
+    def __init__(self, output, shape, length, block=1024):
+        self.stride = output.stride
+        times = np.arange(length)[::self.stride]
+        self.stream = SummaryStream(shape, times, output.tail) if output.summary else None
+        self.columns = np.empty((*shape, len(times))) if self.stream is None else None
+        self.block = np.empty((min(block, len(times)), *shape))
+        self.filled = 0
+        self.flushed = 0
+        self.iteration = 0
+
+    def record(self, column):
+        """Takes the (*shape) column of the next iteration."""
+        if self.iteration % self.stride == 0:
+            self.block[self.filled] = column
+            self.filled += 1
+            if self.filled == len(self.block):
+                self.flush()
+        self.iteration += 1
+
+    def flush(self):
+        columns = np.moveaxis(self.block[:self.filled], 0, -1)
+        if self.stream is None:
+            self.columns[..., self.flushed:self.flushed + self.filled] = columns
+        else:
+            self.stream.update(np.ascontiguousarray(columns))
+        self.flushed += self.filled
+        self.filled = 0
+
+    def result(self):
+        """The (*shape, recorded) array to write: the kept columns, or their summaries."""
+        if self.filled:
+            self.flush()
+        return self.columns if self.stream is None else self.stream.result()
+
+class SummaryStream:
+    """Running drift slope, tail mean and final value of a block of series, fed their columns in order.
+
+    times are the iterations of all the columns to come. Knowing them up front lets the slope use
+    centred times, so one running sum per series gives the least-squares slope without the
+    cancellation of the textbook sums.
+    """
+
+    def __init__(self, shape, times, tail):
+        times = np.asarray(times, dtype=float)
+        self.centred = times - times.mean()
+        self.in_tail = (times > times[-1] - tail).astype(float)
+        self.count = 0
+        self.weighted = np.zeros(shape)
+        self.tail_sum = np.zeros(shape)
+        self.final = np.full(shape, np.nan)
+
+    def update(self, columns):
+        """Adds the next columns, a (*shape, n) array, or a single (*shape) column."""
+        columns = np.asarray(columns, dtype=float)
+        if columns.ndim == self.weighted.ndim:
+            columns = columns[..., None]
+        span = slice(self.count, self.count + columns.shape[-1])
+        self.weighted += columns @ self.centred[span]
+        self.tail_sum += columns @ self.in_tail[span]
+        # Copied, since callers may refill the block they passed
+        self.final = columns[..., -1].copy()
+        self.count = span.stop
+
+    def result(self):
+        """(*shape, len(SUMMARIES)) array of the summaries of everything fed so far."""
+        spread = self.centred @ self.centred
+        slope = self.weighted / spread if spread > 0 else np.full(self.weighted.shape, np.nan)
+        return np.stack([slope, self.tail_sum / self.in_tail.sum(), self.final], axis=-1)
@@ -0,0 +1,79 @@
+import numpy as np
+
+# Slots allocated for a new buffer
+MIN_CAPACITY = 8
+
+class RingBuffer:
+    """Growable circular buffer of records in insertion order, one NumPy array per field.
+
+    Records live in the slots head, head + 1, ... (mod capacity); a full buffer doubles, so appends
+    are amortized O(1) and never copy the live records on their own. Dropping the oldest records
+    only moves the head.
+    """
+
+    def __init__(self, fields, capacity=MIN_CAPACITY):
+        """fields maps each field name to its dtype."""
+        capacity = max(capacity, MIN_CAPACITY)
+        self.arrays = {name: np.zeros(capacity, dtype=dtype) for name, dtype in fields.items()}
+        self.capacity = capacity
+        self.head = 0
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def append(self, **record):
+        if self.length == self.capacity:
+            self._grow()
+        slot = (self.head + self.length) % self.capacity
+        for name, value in record.items():
+            self.arrays[name][slot] = value
+        self.length += 1
+
+    def extend(self, **columns):
+        """Append equal-length arrays of records, one array per field."""
+        count = len(next(iter(columns.values())))
+        while self.length + count > self.capacity:
+            self._grow()
+        slots = (self.head + self.length + np.arange(count)) % self.capacity
+        for name, values in columns.items():
+            self.arrays[name][slots] = values
+        self.length += count
+
+    def field(self, name):
+        """The field's live values, oldest first (a copy only when the buffer wraps)."""
+        array = self.arrays[name]
+        end = self.head + self.length
+        if end <= self.capacity:
+            return array[self.head:end]
+        return np.concatenate([array[self.head:], array[:end - self.capacity]])
+
+    def count_at_most(self, name, threshold):
+        """Number of leading records whose field is <= threshold; the field must be ascending."""
+        if not self.length or self.arrays[name][self.head] > threshold:
+            return 0
+        array = self.arrays[name]
+        end = self.head + self.length
+        if end <= self.capacity:
+            return int(np.searchsorted(array[self.head:end], threshold, side='right'))
+        count = int(np.searchsorted(array[self.head:], threshold, side='right'))
+        if count == self.capacity - self.head:
+            count += int(np.searchsorted(array[:end - self.capacity], threshold, side='right'))
+        return count
+
+    def pop_front(self, count):
+        """Drop the `count` oldest records and return them as {field: array}."""
+        popped = {name: np.take(array, np.arange(self.head, self.head + count), mode='wrap')
+                  for name, array in self.arrays.items()}
+        self.head = (self.head + count) % self.capacity
+        self.length -= count
+        return popped
+
+    def _grow(self):
+        # Unroll the live records to the front of buffers twice the size
+        for name, array in self.arrays.items():
+            grown = np.zeros(2 * self.capacity, dtype=array.dtype)
+            grown[:self.length] = self.field(name)
+            self.arrays[name] = grown
+        self.capacity *= 2
+        self.head = 0
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Word draws made per call into NumPy
+BLOCK_SIZE = 65536
+
+class WordSampler:
+    """Draws word indices with fixed weights from a precomputed CDF, a block of draws at a time.
+
+    Word frequencies never change during a run, so the cumulative weights are built once and
+    each block of draws is a single searchsorted over BLOCK_SIZE uniforms.
+    """
+
+    def __init__(self, weights, rng=None, block_size=BLOCK_SIZE):
+        weights = np.asarray(weights, dtype=float)
+        self.cdf = np.cumsum(weights) / weights.sum()
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.block_size = block_size
+        self._block = []
+        self._position = 0
+
+    def draw(self, n):
+        """Array of n word indices."""
+        indices = np.searchsorted(self.cdf, self.rng.random(n), side='right')
+        return np.minimum(indices, len(self.cdf) - 1)
+
+    def next(self):
+        """Next word index from the current block, drawing a new block when it runs out."""
+        if self._position == len(self._block):
+            self._block = self.draw(self.block_size).tolist()
+            self._position = 0
+        index = self._block[self._position]
+        self._position += 1
+        return index
+
+class LexiconWordSampler(WordSampler):
+    """Draws the words of a run that has only some of the lexicon's words, through the full lexicon's CDF.
+
+    Every draw takes exactly one uniform from rng; one that lands on a word the run does not have is
+    redrawn from spare_rng until it lands on one it has. That samples the present words with the same
+    probabilities as a WordSampler over them alone, while runs driven by the same rng still pick the
+    same word at every step where both have it (common random numbers). present lists the lexicon
+    index of each of the run's words, in the run's order; draws are returned as run indices.
+    """
+
+    def __init__(self, lexicon_weights, present, rng=None, spare_rng=None, block_size=BLOCK_SIZE):
+        super().__init__(lexicon_weights, rng, block_size)
+        self.spare_rng = spare_rng if spare_rng is not None else np.random.default_rng()
+        self.run_index = np.full(len(self.cdf), -1)
+        self.run_index[np.asarray(present, dtype=np.int64)] = np.arange(len(present))
+
+    def draw(self, n):
+        """Array of n run word indices."""
+        indices = self.run_index[super().draw(n)]
+        missing = np.flatnonzero(indices < 0)
+        while len(missing):
+            redrawn = np.minimum(np.searchsorted(self.cdf, self.spare_rng.random(len(missing)), side='right'), len(self.cdf) - 1)
+            indices[missing] = self.run_index[redrawn]
+            missing = missing[indices[missing] < 0]
+        return indices
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import random
+
+import numpy as np
+
+# Written next to outputs that have no header of their own to carry their seeds
+SEED_LOG = 'seeds.json'
+
+def root_entropy(seed=None):
+    """The sweep's root entropy: seed itself, or fresh OS entropy when None (recorded so the sweep can be replayed)."""
+    return np.random.SeedSequence(seed).entropy
+
+def key_part(part):
+    """Non-negative integers are used as is; anything else (a model name, a k string, a decay rate) by a stable hash of its repr."""
+    if isinstance(part, (int, np.integer)) and part >= 0:
+        return int(part)
+    return int.from_bytes(hashlib.sha256(repr(part).encode()).digest()[:8], 'little')
+
+def job_seed(root, *key):
+    """The SeedSequence of the job identified by key, e.g. (model, k, run).
+
+    Equal to the child root.spawn(...)[key[0]].spawn(...)[key[1]]... that SeedSequence.spawn would hand
+    out, but addressed by the job's key instead of its position in a job list, so a job gets the same
+    stream whatever the pool size, the scheduling order or the other jobs in the sweep.
+    """
+    return np.random.SeedSequence(root, spawn_key=tuple(key_part(part) for part in key))
+
+def as_seed_sequence(seed):
+    """seed if it already is a SeedSequence, else a SeedSequence from the int (or fresh entropy for None)."""
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+def streams(seed, n):
+    """n independent child SeedSequences of seed, one per consumer of random numbers in a job."""
+    seed = as_seed_sequence(seed)
+    return [np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key + (i,), pool_size=seed.pool_size)
+            for i in range(n)]
+
+def python_random(seed):
+    """A random.Random seeded from a SeedSequence, for code that draws through the random module API."""
+    return random.Random(int.from_bytes(as_seed_sequence(seed).generate_state(4).tobytes(), 'little'))
+
+def seed_header(seed):
+    """Output metadata that identifies seed; job_seed(header['seed'], *header['seed_key']) rebuilds it."""
+    seed = as_seed_sequence(seed)
+    return {'seed': seed.entropy, 'seed_key': list(seed.spawn_key)}
+
+def seed_digest(seed):
+    """Short SHA-256 digest of a seed's entropy and spawn key, for file names keyed by the seed."""
+    return hashlib.sha256(json.dumps(seed_header(seed)).encode()).hexdigest()[:16]
+
+def sweep_seed(root, run, *key, common=False):
+    """job_seed(root, *key, run), or under common random numbers the stream of run shared by every k and model.
+
+    Common random numbers drive every k (and the decay and overwriting models) of one run with the same
+    word draws and matched uniforms for the exemplar choices, so differences between k are paired
+    comparisons with most of the run-to-run noise cancelled.
+    """
+    return job_seed(root, 'common', run) if common else job_seed(root, *key, run)
+
+def write_seed_log(runs, path=SEED_LOG, merge=False):
+    """Writes {run label: seed_header(seed)} for runs whose output formats have no room for the seed.
+
+    With merge, the entries of an existing log are kept, except those relabelled by runs.
+    """
+    log = {}
+    if merge and os.path.exists(path):
+        with open(path, 'r') as file:
+            log = json.load(file)
+    log.update({label: seed_header(seed) for label, seed in runs.items()})
+    with open(path, 'w') as file:
+        json.dump(log, file, indent=4)
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+from sim_core.grid import ValueGrid
+from sim_core.seeding import seed_digest
+
+# Burned-in grids are cached here, relative to the working directory the model is run from
+CACHE_DIR = 'burn_in_cache'
+# Lexicon snapshots (final states, or starting states in place of the input JSON) are .npz files of
+# the word table (words, frequencies) and either the value grid's arrays, prefixed with GRID_PREFIX,
+# or every word's exemplar values, flattened with their counts per word
+SNAPSHOT_EXTENSION = '.npz'
+GRID_PREFIX = 'grid_'
+
+def is_snapshot(path):
+    return path.endswith(SNAPSHOT_EXTENSION)
+
+def source_digest(source_file):
+    """Short SHA-256 digest of the source file's bytes, so an edited lexicon never reuses old snapshots."""
+    with open(source_file, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+def snapshot_path(source_file, decay_rate, seed, threshold, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f'burn_in_{source_digest(source_file)}_k{decay_rate!r}_t{threshold!r}_seed{seed_digest(seed)}.npz')
+
+def save_arrays(path, arrays, compress=True):
+    # Write to a temporary file first so that workers racing on the same snapshot never read a partial one
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=SNAPSHOT_EXTENSION, dir=os.path.dirname(path) or '.')
+    with os.fdopen(fd, 'wb') as f:
+        (np.savez_compressed if compress else np.savez)(f, **arrays)
+    os.replace(temp_path, path)
+
+def save_grid(path, grid):
+    save_arrays(path, grid.state())
+
+def load_grid(path):
+    with np.load(path) as state:
+        return ValueGrid.from_state(state)
+
+def save_snapshot(path, words, frequencies, grid=None, exemplars_per_word=None, compress=True):
+    """Writes a lexicon snapshot holding the value grid (the Shahil decay engine) or each word's exemplar values."""
+    arrays = {'words': np.array(words, dtype=str), 'frequencies': np.array(frequencies, dtype=np.int64)}
+    if grid is not None:
+        arrays.update({GRID_PREFIX + name: array for name, array in grid.state().items()})
+    if exemplars_per_word is not None:
+        arrays['exemplar_counts'] = np.array([len(exemplars) for exemplars in exemplars_per_word], dtype=np.int64)
+        arrays['exemplars'] = np.concatenate([np.asarray(exemplars, dtype=np.float64) for exemplars in exemplars_per_word])
+    save_arrays(path, arrays, compress)
+
+def load_snapshot(path):
+    """Returns (words, frequencies, grid, exemplars_per_word) of a snapshot, with None for the part it does not hold."""
+    with np.load(path) as snapshot:
+        words = snapshot['words'].tolist()
+        frequencies = snapshot['frequencies'].tolist()
+        grid = exemplars_per_word = None
+        if GRID_PREFIX + 'weights' in snapshot.files:
+            grid = ValueGrid.from_state({name[len(GRID_PREFIX):]: snapshot[name] for name in snapshot.files
+                                         if name.startswith(GRID_PREFIX)})
+        if 'exemplars' in snapshot.files:
+            exemplars_per_word = np.split(snapshot['exemplars'], np.cumsum(snapshot['exemplar_counts'])[:-1])
+    return words, frequencies, grid, exemplars_per_word
+
+def cached_burn_in(grid, source_file, decay_rate, seed, threshold, burn_in, cache_dir=CACHE_DIR):
+    """The grid loaded from source_file after the burn-in for (decay_rate, seed, threshold).
+
+    On a cache miss burn_in(grid, seed) burns the freshly loaded grid in place and the result is
+    saved; on a hit the snapshot is returned instead and grid is left untouched.
+    """
+    path = snapshot_path(source_file, decay_rate, seed, threshold, cache_dir)
+    if os.path.exists(path):
+        return load_grid(path)
+    burn_in(grid, seed)
+    save_grid(path, grid)
+    return grid
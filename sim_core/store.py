@@ -0,0 +1,119 @@
+import json
+import os
+import shutil
+
+import numpy as np
+
+from sim_core.events import EXTENSION as EVENTS_EXTENSION
+from sim_core.output import SUMMARIES
+from sim_core.seeding import SEED_LOG, write_seed_log
+from sim_core.trajectory import (CHANGEPOINTS, EXTENSION, create_trajectory, read_changepoints, read_header,
+                                 read_trajectory, write_changepoints)
+
+# A sweep store is a directory with one chunk per k (or decay rate): a trajectory file holding the
+# (run, stat, bin, iteration) array of every run at that k. The sweep preallocates the chunks and
+# each worker writes its run's block in place, so the charts can memory-map a whole sweep and slice
+# it without reading the bytes they do not use.
+# With the change-point encoding, runs differ in size, so a chunk is instead a directory with the
+# chunk's header and one change-point file per run.
+CHUNK_PREFIX = 'chunk_'
+CHUNK_HEADER = 'header.json'
+# Runs that record their event logs (see sim_core/events.py) keep them in one directory per key
+EVENTS_PREFIX = 'events_'
+
+def chunk_path(store, key):
+    return os.path.join(store, f'{CHUNK_PREFIX}{key}{EXTENSION}')
+
+def chunk_dir(store, key):
+    return os.path.join(store, f'{CHUNK_PREFIX}{key}')
+
+def run_path(store, key, run):
+    return os.path.join(chunk_dir(store, key), f'run_{run}{EXTENSION}')
+
+def events_dir(store, key):
+    return os.path.join(store, f'{EVENTS_PREFIX}{key}')
+
+def events_path(store, key, run):
+    return os.path.join(events_dir(store, key), f'run_{run}{EVENTS_EXTENSION}')
+
+def create_store(store, keys, runs, stat_names, bins, length, seeds=None, encoding=None, **metadata):
+    """Prepares a chunk for every key (replacing any earlier one); chunks of other keys are kept.
+
+    Without encoding the chunks are preallocated and zero-filled; with encoding='changepoints' the
+    runs are stored as change points. seeds optionally maps run labels to the seeds that produced
+    them, merged into the store directory's log so the seeds of the chunks kept stay recorded.
+    """
+    os.makedirs(store, exist_ok=True)
+    shape = (runs, len(stat_names), bins, length)
+    for key in keys:
+        for directory in (chunk_dir(store, key), events_dir(store, key)):
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+        if os.path.exists(chunk_path(store, key)):
+            os.remove(chunk_path(store, key))
+        if encoding == CHANGEPOINTS:
+            os.makedirs(chunk_dir(store, key))
+            with open(os.path.join(chunk_dir(store, key), CHUNK_HEADER), 'w') as f:
+                json.dump({**metadata, 'key': key, 'stats': list(stat_names), 'shape': list(shape), 'encoding': encoding}, f)
+        else:
+            create_trajectory(chunk_path(store, key), shape, stat_names, key=key, **metadata)
+    if seeds is not None:
+        write_seed_log(seeds, os.path.join(store, SEED_LOG), merge=True)
+
+def chunk_header(store, key):
+    """The header of one key's chunk: its stats, (run, stat, bin, iteration) shape and sweep metadata."""
+    if os.path.isdir(chunk_dir(store, key)):
+        with open(os.path.join(chunk_dir(store, key), CHUNK_HEADER), 'r') as f:
+            return json.load(f)
+    with open(chunk_path(store, key), 'rb') as f:
+        return read_header(f)[0]
+
+def write_run(store, key, run, trajectories, ratios=None):
+    """Writes one run's (stat, bin, iteration) array into its block of the key's chunk.
+
+    ratios is passed on to the change-point encoding (see ChangePoints) and unused otherwise.
+    """
+    if os.path.isdir(chunk_dir(store, key)):
+        write_changepoints(run_path(store, key, run), trajectories, chunk_header(store, key)['stats'], ratios,
+                           key=key, run=run)
+        return
+    # Workers write disjoint blocks of the shared mapping, so they never need to coordinate
+    header, chunk = read_trajectory(chunk_path(store, key), mode='r+')
+    chunk[run] = trajectories
+    chunk.flush()
+
+def store_keys(store):
+    """The keys with a chunk in the store, in name order, e.g. to pick the ones with k >= 0.99."""
+    names = [name[len(CHUNK_PREFIX):] for name in os.listdir(store) if name.startswith(CHUNK_PREFIX)]
+    return sorted(name[:-len(EXTENSION)] if name.endswith(EXTENSION) else name for name in names)
+
+def open_chunk(store, key):
+    """(header, read-only memory map of the (run, stat, bin, iteration) array) of one key's preallocated chunk."""
+    return read_trajectory(chunk_path(store, key))
+
+def select(store, stat, keys=None, runs=slice(None), bins=slice(None), iterations=slice(None)):
+    """(key, run, bin, iteration) array of one stat, copied out of the chunks.
+
+    Only the pages holding the selected iterations of the selected (run, bin) rows are read, e.g.
+    select(store, 'variances', ['99000', '99890'], bins=slice(6, 12), iterations=slice(0, 5001));
+    change-point chunks read the selected runs' files and expand only the selected rows and window.
+    keys defaults to every key in the store.
+    """
+    keys = store_keys(store) if keys is None else keys
+    selected = []
+    for key in keys:
+        header = chunk_header(store, key)
+        index = header['stats'].index(stat)
+        if header.get('encoding') == CHANGEPOINTS:
+            run_numbers = np.arange(header['shape'][0])[runs]
+            selected.append(np.stack([read_changepoints(run_path(store, key, run))[1].expand(slice(index, index + 1), bins, iterations)[0]
+                                      for run in run_numbers]))
+        else:
+            header, chunk = open_chunk(store, key)
+            selected.append(np.array(chunk[runs, index, bins, iterations]))
+    return np.stack(selected)
+
+def select_summary(store, stat, summary, keys=None, runs=slice(None), bins=slice(None)):
+    """(key, run, bin) array of one summary ('slope', 'tail_mean' or 'final', see OutputPolicy) of one stat,
+    from a store written with a summary-only output policy."""
+    return select(store, stat, keys, runs, bins, SUMMARIES.index(summary))
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+def _run_job(args):
+    function, index, job = args
+    return index, function(job)
+
+def run_sweep(function, jobs, cost=None, processes=None, report=True):
+    """Runs function(job) for every job on one persistent pool and returns the results in job order.
+
+    Jobs are submitted most expensive first by cost(job) (only the ordering matters), one at a time,
+    so the slow jobs start early and the short ones fill the gaps at the end instead of the workers
+    idling behind one straggler. Completions are reported on stderr as they arrive.
+    """
+    order = sorted(range(len(jobs)), key=lambda index: -cost(jobs[index])) if cost else range(len(jobs))
+    results = [None] * len(jobs)
+    start = time.time()
+    with Pool(processes=processes) as pool:
+        tasks = [(function, index, jobs[index]) for index in order]
+        for done, (index, result) in enumerate(pool.imap_unordered(_run_job, tasks, chunksize=1), 1):
+            results[index] = result
+            if report:
+                print(f"[{done}/{len(jobs)}] job {index} done, {time.time() - start:.1f}s elapsed", file=sys.stderr)
+    return results
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest finished child, in MB (None without resource)."""
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 / 2 ** 20 if sys.platform == 'darwin' else 1 / 2 ** 10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit)
+
+def report_usage(label, start):
+    """Prints the wall-clock time since start and the peak RSS so far on stderr."""
+    parent, child = peak_rss_mb()
+    memory = f", peak RSS {parent:.0f} MB (parent) / {child:.0f} MB (largest worker)" if parent is not None else ""
+    print(f"{label}: {time.time() - start:.1f}s wall-clock{memory}", file=sys.stderr)
+
+def run_batches(function, items, processes=None, label='batches', runs=None):
+    """Splits items into one contiguous batch per worker and runs function(batch) on a pool of that size.
+
+    Each worker starts once and handles its whole batch in-process, so per-run setup that function
+    does once per batch (imports, loading input data) is paid once per worker instead of once per
+    item. processes defaults to the number of cores. Wall-clock time and peak RSS are reported; runs is
+    the number of runs the items stand for (one per item unless given, e.g. for ensemble items).
+    """
+    items = list(items)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(items)))
+    size, extra = divmod(len(items), processes)
+    batches, start = [], 0
+    for worker in range(processes):
+        end = start + size + (worker < extra)
+        batches.append(items[start:end])
+        start = end
+    begin = time.time()
+    with Pool(processes=processes) as pool:
+        results = pool.map(function, batches, chunksize=1)
+    report_usage(f"{label} ({len(items) if runs is None else runs} runs on {processes} workers)", begin)
+    return results
@@ -0,0 +1,189 @@
+import json
+import struct
+
+import numpy as np
+
+# File layout: magic, header length (uint32, little-endian), JSON header, then the raw float64
+# array of shape (stats, bins, iterations + 1) in C order starting at a 64-byte boundary (a chunk of a
+# sweep store in sim_core/store.py holds (runs, stats, bins, iterations + 1) in the same layout)
+MAGIC = b'SDSTRAJ1'
+ALIGNMENT = 64
+EXTENSION = '.traj'
+
+# Change-point files use the same header (with encoding set) followed by the row offsets (int64),
+# the values (float64) and the iterations (int32) of every change point, rows in (stat, bin) order
+CHANGEPOINTS = 'changepoints'
+
+def write_header(f, shape, stat_names, metadata):
+    write_json_header(f, {
+        **metadata,
+        'stats': list(stat_names),
+        'shape': list(shape),
+        'dtype': '<f8'
+    })
+
+def write_json_header(f, header, magic=MAGIC):
+    """Writes magic, the header's length and the JSON header, padded so the data after it is aligned."""
+    encoded = json.dumps(header).encode()
+    padding = -(len(magic) + 4 + len(encoded)) % ALIGNMENT
+    encoded += b' ' * padding
+    f.write(magic)
+    f.write(struct.pack('<I', len(encoded)))
+    f.write(encoded)
+
+def write_trajectory(path, trajectories, stat_names, **metadata):
+    """Writes a (stats, bins, iterations + 1) array with a JSON header of stat names and run metadata."""
+    trajectories = np.ascontiguousarray(trajectories, dtype='<f8')
+    with open(path, 'wb') as f:
+        write_header(f, trajectories.shape, stat_names, metadata)
+        f.write(trajectories.tobytes())
+
+def create_trajectory(path, shape, stat_names, **metadata):
+    """Writes the header of a zero-filled array of the given shape, to be filled in place through read_trajectory(path, mode='r+')."""
+    with open(path, 'wb') as f:
+        write_header(f, shape, stat_names, metadata)
+        # Extending the file leaves the data as zeros without writing them (a sparse file where supported)
+        f.truncate(f.tell() + int(np.prod(shape)) * 8)
+
+class ChangePoints:
+    """Change-point encoding of a (stats, bins, iterations + 1) array.
+
+    Each (stat, bin) row is stored as the iterations where it departs from its rule (the first
+    always included) and its values there. Between change points a row repeats its value times the
+    stat's ratio, bit for bit as the models compute it: ratio 1 for statistics that only move when
+    their bin is chosen, and the decay factor k for strengths that decay every iteration.
+    """
+
+    def __init__(self, shape, offsets, iterations, values, ratios=None):
+        self.shape = tuple(shape)
+        self.offsets = offsets
+        self.iterations = iterations
+        self.values = values
+        self.ratios = np.ones(self.shape[0]) if ratios is None else np.asarray(ratios, dtype=float)
+
+    @classmethod
+    def encode(cls, trajectories, ratios=None):
+        """Encodes an array losslessly; ratios gives each stat's per-iteration factor (all 1 by default)."""
+        trajectories = np.asarray(trajectories, dtype='<f8')
+        stats, bins, length = trajectories.shape
+        ratios = np.ones(stats) if ratios is None else np.asarray(ratios, dtype=float)
+        # Compare bit patterns, so NaNs and signed zeros survive the round trip
+        predicted = trajectories[:, :, :-1] * ratios[:, None, None]
+        changed = np.ones(trajectories.shape, dtype=bool)
+        changed[:, :, 1:] = trajectories[:, :, 1:].view('<i8') != predicted.view('<i8')
+        rows, iterations = np.nonzero(changed.reshape(stats * bins, length))
+        offsets = np.zeros(stats * bins + 1, dtype='<i8')
+        np.cumsum(np.bincount(rows, minlength=stats * bins), out=offsets[1:])
+        return cls(trajectories.shape, offsets, iterations.astype('<i4'), trajectories.reshape(stats * bins, length)[rows, iterations], ratios)
+
+    def row(self, stat, bin):
+        """(iterations, values) of the change points of one row."""
+        r = stat * self.shape[1] + bin
+        return self.iterations[self.offsets[r]:self.offsets[r + 1]], self.values[self.offsets[r]:self.offsets[r + 1]]
+
+    def value_at(self, stat, bin, iteration, exact=False):
+        """Value of one row at one iteration, by a binary search over its change points.
+
+        Decaying rows take the closed form value * ratio ** steps since the change point, which agrees
+        with the models to rounding; with exact the models' multiplications are repeated instead, bit
+        for bit but in time proportional to the steps.
+        """
+        iterations, values = self.row(stat, bin)
+        point = np.searchsorted(iterations, iteration, side='right') - 1
+        value, steps, ratio = values[point], int(iteration - iterations[point]), self.ratios[stat]
+        if ratio == 1 or steps == 0:
+            return float(value)
+        if not exact:
+            return float(value * ratio ** steps)
+        for _ in range(steps):
+            value = value * ratio
+        return float(value)
+
+    def expand(self, stats=slice(None), bins=slice(None), iterations=slice(None)):
+        """The dense array, or the selected part of it, rebuilt without a loop over iterations."""
+        stat_numbers = np.arange(self.shape[0])[stats]
+        bin_numbers = np.arange(self.shape[1])[bins]
+        start, stop, step = iterations.indices(self.shape[2])
+        # Rebuild [start, stop) of every selected row; constant rows only need their points in it
+        rows = (stat_numbers[:, None] * self.shape[1] + bin_numbers[None, :]).ravel()
+        window = max(stop - start, 0)
+        dense = np.empty((len(rows), window))
+        for index, r in enumerate(rows):
+            dense[index] = self._expand_row(r, start, stop)
+        return dense.reshape(len(stat_numbers), len(bin_numbers), window)[:, :, ::step]
+
+    def _expand_row(self, r, start, stop):
+        first, last = self.offsets[r], self.offsets[r + 1]
+        iterations, values = self.iterations[first:last], self.values[first:last]
+        ratio = self.ratios[r // self.shape[1]]
+        if stop <= start:
+            return np.empty(0)
+        # The points in effect over [start, stop)
+        begin = np.searchsorted(iterations, start, side='right') - 1
+        end = np.searchsorted(iterations, stop, side='left')
+        iterations, values = iterations[begin:end], values[begin:end]
+        if ratio == 1:
+            # Each point repeated up to the next
+            bounds = np.clip(np.append(iterations, stop), start, stop)
+            return np.repeat(values, np.diff(bounds))
+        # Segments start at change points and multiply by ratio each iteration; step all segments
+        # together, longest first, so the loop runs over segment length rather than iterations
+        first = iterations[0]
+        lengths = np.diff(np.append(iterations, stop))
+        order = np.argsort(-lengths, kind='stable')
+        starts, lengths, current = iterations[order] - first, lengths[order], np.array(values[order])
+        row = np.empty(stop - first)
+        row[starts] = current
+        for offset in range(1, lengths[0]):
+            active = np.searchsorted(-lengths, -offset, side='left')
+            current = current[:active] * ratio
+            row[starts[:active] + offset] = current
+        return row[start - first:]
+
+def write_changepoints(path, trajectories, stat_names, ratios=None, **metadata):
+    """Writes a (stats, bins, iterations + 1) array as change points; read_trajectory expands it again."""
+    points = ChangePoints.encode(trajectories, ratios)
+    with open(path, 'wb') as f:
+        write_header(f, points.shape, stat_names, {**metadata, 'encoding': CHANGEPOINTS,
+                                                   'ratios': points.ratios.tolist(), 'points': len(points.values)})
+        f.write(points.offsets.tobytes())
+        f.write(points.values.astype('<f8').tobytes())
+        f.write(points.iterations.tobytes())
+
+def read_points(path, header, offset):
+    """ChangePoints of a change-point file with data from offset on. The row offsets are read and the values
+    and iterations memory-mapped, so lookups and expansions only read the pages of the rows they use."""
+    stats, bins, length = header['shape']
+    offsets = np.array(np.memmap(path, dtype='<i8', mode='r', offset=offset, shape=(stats * bins + 1,)))
+    offset += offsets.nbytes
+    values = np.memmap(path, dtype='<f8', mode='r', offset=offset, shape=(header['points'],))
+    iterations = np.memmap(path, dtype='<i4', mode='r', offset=offset + values.nbytes, shape=(header['points'],))
+    return ChangePoints(header['shape'], offsets, iterations, values, header['ratios'])
+
+def read_changepoints(path):
+    """Returns (header, ChangePoints) of a change-point file, for point lookups and partial expansion."""
+    with open(path, 'rb') as f:
+        header, offset = read_header(f)
+    return header, read_points(path, header, offset)
+
+def read_header(f, magic=MAGIC):
+    """Returns (header, offset of the data after it); magic tells the kind of file expected."""
+    if f.read(len(magic)) != magic:
+        raise ValueError(f"Not a {'trajectory' if magic == MAGIC else magic.decode()} file: {f.name}")
+    (length,) = struct.unpack('<I', f.read(4))
+    return json.loads(f.read(length)), len(magic) + 4 + length
+
+def read_trajectory(path, mmap=True, mode='r'):
+    """Returns (header, array); the array is a memory map (read-only unless mode='r+') unless mmap is False.
+
+    Change-point files are expanded into an ordinary array.
+    """
+    with open(path, 'rb') as f:
+        header, offset = read_header(f)
+        shape = tuple(header['shape'])
+        if header.get('encoding') == CHANGEPOINTS:
+            return header, read_points(path, header, offset).expand()
+        if not mmap:
+            array = np.fromfile(f, dtype=header['dtype'], count=int(np.prod(shape))).reshape(shape)
+            return header, array
+    return header, np.memmap(path, dtype=header['dtype'], mode=mode, offset=offset, shape=shape)